@@ -0,0 +1,350 @@
+"""
+Benchmarks del backend contra un mongod local.
+
+Cada benchmark trabaja sobre una base de datos temporal (<DB_NAME>_bench) que se
+elimina al terminar, salvo que se indique --keep.
+
+Uso (desde el directorio backend):
+    python benchmarks.py indexes --psychologists 2000 --patients-per-psychologist 500
+    python benchmarks.py payment-stats --payments 100000
+    python benchmarks.py policy
+    python benchmarks.py serialization --patients 1000
+"""
+import asyncio
+import json
+import os
+import random
+import statistics
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Any, Awaitable, Callable, Dict, List
+
+import typer
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+import policy
+import seed_data
+from server import (
+    INDEX_SPECS,
+    Patient,
+    client,
+    compute_payment_stats,
+    ensure_indexes,
+    list_patient_collections,
+    model_list_response,
+    rebuild_payment_rollups,
+)
+
+cli = typer.Typer(help="Psychology Practice Management System - benchmarks")
+
+BENCH_DB_NAME = f"{os.environ['DB_NAME']}_bench"
+
+
+async def time_query(run: Callable[[], Awaitable], repeat: int) -> Dict[str, float]:
+    """Ejecuta una consulta varias veces y devuelve p50/p95/max en milisegundos"""
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await run()
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return {
+        "p50": statistics.median(latencies),
+        "p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+        "max": latencies[-1],
+    }
+
+
+def print_results(title: str, results: Dict[str, Dict[str, float]]):
+    typer.echo(f"\n{title}")
+    typer.echo(f"{'query':<32}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for name, stats in results.items():
+        typer.echo(f"{name:<32}{stats['p50']:>10.2f}{stats['p95']:>10.2f}{stats['max']:>10.2f}")
+
+
+async def list_patients_page(database, user, limit: int) -> List[Dict[str, Any]]:
+    """Lo que lee GET /api/patients: una página del directorio y los pacientes de cada tenant"""
+    entries = await database.patient_directory.find(
+        policy.compile_filter(user, policy.PATIENT_LIST), {"_id": 0, "id": 1, "collection": 1}
+    ).sort("id", 1).limit(limit + 1).to_list(limit + 1)
+    ids_by_collection: Dict[str, List[str]] = {}
+    for entry in entries[:limit]:
+        ids_by_collection.setdefault(entry["collection"], []).append(entry["id"])
+    results = await asyncio.gather(*(
+        database[name].find({"id": {"$in": ids}}, {"_id": 0}).to_list(len(ids))
+        for name, ids in ids_by_collection.items()
+    ))
+    return [patient for patients in results for patient in patients]
+
+
+async def read_patient(database, user, patient_id: str) -> Dict[str, Any]:
+    """Lo que lee GET /api/patients/{id}: entrada del directorio y paciente con el permiso en el filtro"""
+    entry = await database.patient_directory.find_one({"id": patient_id}, {"_id": 0, "collection": 1})
+    return await database[entry["collection"]].find_one(
+        {"id": patient_id, **policy.compile_filter(user, policy.PATIENT)}, {"_id": 0}
+    )
+
+
+@cli.command()
+def indexes(
+    psychologists: int = typer.Option(2000, help="Psychologists to seed"),
+    patients_per_psychologist: int = typer.Option(500, help="Patients per psychologist"),
+    page_size: int = typer.Option(50, help="Page size for the patient list"),
+    repeat: int = typer.Option(50, help="Executions per query"),
+    keep: bool = typer.Option(False, help="Keep the benchmark database"),
+):
+    """Latencia de las lecturas de pacientes (directorio + tenants) sin y con índices"""
+    async def run():
+        database = client[BENCH_DB_NAME]
+        await client.drop_database(BENCH_DB_NAME)
+
+        config = seed_data.SeedConfig(
+            psychologists=psychologists,
+            centers=max(1, psychologists // 20),
+            patients_per_psychologist=patients_per_psychologist,
+            anamnesis_fraction=0.0,
+            appointments_per_patient=0,
+            payments_per_patient=0,
+            objectives_per_patient=0,
+        )
+        typer.echo(f"Seeding {psychologists * patients_per_psychologist} patients into {BENCH_DB_NAME}...")
+        await seed_data.seed(database, config)
+        # seed() deja los índices creados: se quitan para medir el punto de partida
+        patient_collections = ["patient_directory", *await list_patient_collections(database)]
+        for collection_name in patient_collections:
+            await database[collection_name].drop_indexes()
+
+        rng = random.Random(42)
+        users = [
+            SimpleNamespace(**user)
+            for user in await database.users.find(
+                {"role": {"$in": [policy.PSYCHOLOGIST, policy.CENTER_ADMIN]}}, {"_id": 0, "id": 1, "role": 1, "center_id": 1}
+            ).to_list(None)
+        ]
+        psychologist_users = {user.id: user for user in users if user.role == policy.PSYCHOLOGIST}
+        center_admins = [user for user in users if user.role == policy.CENTER_ADMIN]
+        sample = await database.patient_directory.aggregate([
+            {"$sample": {"size": repeat}}, {"$project": {"_id": 0, "id": 1, "psychologist_id": 1}},
+        ]).to_list(repeat)
+
+        async def get_sampled_patient():
+            entry = rng.choice(sample)
+            await read_patient(database, psychologist_users[entry["psychologist_id"]], entry["id"])
+
+        def queries():
+            psychologist = rng.choice(list(psychologist_users.values()))
+            return {
+                "list (psychologist)": lambda: list_patients_page(database, psychologist, page_size),
+                "list (center admin)": lambda: list_patients_page(database, rng.choice(center_admins), page_size),
+                "get patient": get_sampled_patient,
+            }
+
+        before = {name: await time_query(q, repeat) for name, q in queries().items()}
+        print_results("Without indexes", before)
+
+        start = time.perf_counter()
+        await ensure_indexes(database, include_tenants=True)
+        typer.echo(f"\nensure_indexes took {time.perf_counter() - start:.1f}s "
+                   f"({len(INDEX_SPECS)} collections + {len(patient_collections) - 1} tenants)")
+
+        after = {name: await time_query(q, repeat) for name, q in queries().items()}
+        print_results("With indexes", after)
+
+        if not keep:
+            await client.drop_database(BENCH_DB_NAME)
+
+    try:
+        asyncio.run(run())
+    finally:
+        client.close()
+
+
+async def legacy_payment_stats(database, query):
+    """Implementación anterior de /api/payments/stats: carga los pagos en Python"""
+    all_payments = await database.payments.find(query).to_list(10000)
+    now = datetime.now()
+    today = now.strftime("%Y-%m-%d")
+    week_start = (now - timedelta(days=now.weekday())).strftime("%Y-%m-%d")
+    month_start = now.replace(day=1).strftime("%Y-%m-%d")
+    monthly = [p for p in all_payments if p["payment_date"] >= month_start]
+    return {
+        "daily_total": sum(p["amount"] for p in all_payments if p["payment_date"] == today),
+        "weekly_total": sum(p["amount"] for p in all_payments if p["payment_date"] >= week_start),
+        "monthly_total": sum(p["amount"] for p in monthly),
+        "total_payments": len(all_payments),
+    }
+
+
+async def aggregated_payment_stats(database, query):
+    """Agregación con $facet directamente sobre payments, sin payment_daily_rollups"""
+    now = datetime.now()
+    today = now.strftime("%Y-%m-%d")
+    week_start = (now - timedelta(days=now.weekday())).strftime("%Y-%m-%d")
+    month_start = now.replace(day=1).strftime("%Y-%m-%d")
+
+    def window(match: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return [
+            {"$match": {"payment_date": match}},
+            {"$group": {"_id": None, "total": {"$sum": "$amount"}, "count": {"$sum": 1}}},
+        ]
+
+    pipeline = [
+        {"$match": {**query, "payment_date": {"$gte": min(week_start, month_start)}}},
+        {"$project": {"_id": 0, "amount": 1, "payment_date": 1}},
+        {"$facet": {
+            "daily": window(today),
+            "weekly": window({"$gte": week_start}),
+            "monthly": window({"$gte": month_start}),
+        }},
+    ]
+
+    facets, total_payments = await asyncio.gather(
+        database.payments.aggregate(pipeline).to_list(1),
+        database.payments.count_documents(query),
+    )
+    windows = {name: (rows[0] if rows else {"total": 0, "count": 0}) for name, rows in facets[0].items()}
+    monthly = windows["monthly"]
+
+    return {
+        "daily_total": windows["daily"]["total"],
+        "weekly_total": windows["weekly"]["total"],
+        "monthly_total": monthly["total"],
+        "total_payments": total_payments,
+        "average_per_session": monthly["total"] / monthly["count"] if monthly["count"] > 0 else 0
+    }
+
+
+async def measure(run: Callable[[], Awaitable], repeat: int) -> Dict[str, float]:
+    tracemalloc.start()
+    await run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stats = await time_query(run, repeat)
+    stats["peak_mb"] = peak / 1024 / 1024
+    return stats
+
+
+@cli.command("payment-stats")
+def payment_stats(
+    payments: int = typer.Option(100_000, help="Number of payments for the benchmarked psychologist"),
+    days: int = typer.Option(730, help="Spread payments over this many past days"),
+    repeat: int = typer.Option(20, help="Executions per implementation"),
+    keep: bool = typer.Option(False, help="Keep the benchmark database"),
+):
+    """Latencia y memoria de /api/payments/stats: Python vs agregación vs rollups"""
+    async def run():
+        database = client[BENCH_DB_NAME]
+        await client.drop_database(BENCH_DB_NAME)
+        await ensure_indexes(database)
+
+        rng = random.Random(42)
+        psychologist_id = str(uuid.uuid4())
+        today = datetime.now()
+        typer.echo(f"Seeding {payments} payments into {BENCH_DB_NAME}...")
+        for offset in range(0, payments, 10000):
+            batch = []
+            for _ in range(min(10000, payments - offset)):
+                day = (today - timedelta(days=rng.randrange(days))).strftime("%Y-%m-%d")
+                batch.append({
+                    "id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+                    "patient_id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+                    "psychologist_id": psychologist_id,
+                    "amount": float(rng.randrange(30, 150)),
+                    "payment_date": day,
+                    "session_date": day,
+                    "status": "completed",
+                    "created_by": psychologist_id,
+                })
+            await database.payments.insert_many(batch, ordered=False)
+
+        await rebuild_payment_rollups(database)
+
+        query = {"psychologist_id": psychologist_id}
+        results = {
+            "legacy (find + Python)": await measure(lambda: legacy_payment_stats(database, query), repeat),
+            "aggregation ($facet)": await measure(lambda: aggregated_payment_stats(database, query), repeat),
+            "daily rollups": await measure(lambda: compute_payment_stats(query, database=database), repeat),
+        }
+        typer.echo(f"\n{'implementation':<28}{'p50 ms':>10}{'p95 ms':>10}{'peak MB':>10}")
+        for name, stats in results.items():
+            typer.echo(f"{name:<28}{stats['p50']:>10.2f}{stats['p95']:>10.2f}{stats['peak_mb']:>10.2f}")
+        if payments > 10000:
+            typer.echo("\nNote: the legacy implementation truncates at 10000 payments, so its totals are incomplete.")
+
+        if not keep:
+            await client.drop_database(BENCH_DB_NAME)
+
+    try:
+        asyncio.run(run())
+    finally:
+        client.close()
+
+
+@cli.command("policy")
+def policy_checks(
+    iterations: int = typer.Option(1_000_000, help="Checks per role"),
+):
+    """Coste de compile_filter y matches por rol, sin base de datos"""
+    entry = {"id": str(uuid.uuid4()), "psychologist_id": str(uuid.uuid4()), "center_id": str(uuid.uuid4())}
+    users = {
+        role: SimpleNamespace(id=str(uuid.uuid4()), role=role, center_id=entry["center_id"])
+        for role in (policy.PSYCHOLOGIST, policy.CENTER_ADMIN, policy.SUPER_ADMIN)
+    }
+    typer.echo(f"{'role':<16}{'compile ns':>12}{'allows ns':>12}")
+    for role, user in users.items():
+        start = time.perf_counter()
+        for _ in range(iterations):
+            policy.compile_filter(user, policy.PATIENT)
+        compile_ns = (time.perf_counter() - start) / iterations * 1e9
+        start = time.perf_counter()
+        for _ in range(iterations):
+            policy.allows(user, policy.PATIENT, entry)
+        allows_ns = (time.perf_counter() - start) / iterations * 1e9
+        typer.echo(f"{role:<16}{compile_ns:>12.0f}{allows_ns:>12.0f}")
+    client.close()
+
+
+@cli.command()
+def serialization(
+    patients: int = typer.Option(1000, help="Patients in the serialized list"),
+    repeat: int = typer.Option(20, help="Serializations per implementation"),
+):
+    """Tiempo de serializar una lista de pacientes con anamnesis completa"""
+    config = seed_data.SeedConfig(psychologists=1, patients_per_psychologist=patients, anamnesis_fraction=1.0)
+    documents = [
+        document
+        for collection_name, batch in seed_data.generate_psychologist(config, 0)
+        if collection_name.startswith("patients")
+        for document in batch
+    ]
+    models = [Patient(**document) for document in documents]
+    adapter = TypeAdapter(List[Patient])
+
+    def response_model_path() -> bytes:
+        # Lo que hace FastAPI con response_model: validar, volcar en modo JSON, jsonable_encoder y json.dumps
+        content = jsonable_encoder(adapter.dump_python(adapter.validate_python(models), mode="json"))
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+    implementations = {
+        "response_model + json": response_model_path,
+        "model_dump + orjson": lambda: model_list_response(models).body,
+    }
+    typer.echo(f"{'implementation':<28}{'p50 ms':>10}{'p95 ms':>10}{'KB':>10}")
+    for name, serialize in implementations.items():
+        latencies = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            body = serialize()
+            latencies.append((time.perf_counter() - start) * 1000)
+        latencies.sort()
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        typer.echo(f"{name:<28}{statistics.median(latencies):>10.2f}{p95:>10.2f}{len(body) / 1024:>10.0f}")
+    client.close()
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,194 @@
+"""
+Compresión de respuestas negociada con Accept-Encoding.
+
+gzip está siempre disponible; brotli ("br") y zstd se activan solo si están
+instalados los paquetes `brotli` y `zstandard`. Entre las codificaciones que
+acepta el cliente (q > 0) se usa la primera de ENCODING_PREFERENCE.
+
+Solo se comprimen tipos de texto/JSON, respuestas sin Content-Encoding previo y
+cuerpos de al menos `minimum_size` bytes. Las respuestas enviadas en un solo
+mensaje se comprimen de una vez (con Content-Length); las que llegan en varios
+mensajes (StreamingResponse) se comprimen en streaming.
+
+Un ETag fuerte identifica bytes exactos, y los comprimidos no son los que generó
+la aplicación: al comprimir (y en los 304 de clientes que aceptan compresión) el
+ETag pasa a ser débil, W/"...".
+"""
+import zlib
+from typing import Dict, List, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - dependencia opcional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - dependencia opcional
+    zstandard = None
+
+ENCODING_PREFERENCE = ("br", "zstd", "gzip")
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "application/xml", "image/svg+xml")
+
+
+def available_encodings() -> List[str]:
+    encodings = []
+    for encoding in ENCODING_PREFERENCE:
+        if (encoding == "br" and brotli is None) or (encoding == "zstd" and zstandard is None):
+            continue
+        encodings.append(encoding)
+    return encodings
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """{"gzip": 1.0, "br": 0.5, ...}; las entradas mal formadas se ignoran"""
+    accepted = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                continue
+        accepted[coding] = quality
+    return accepted
+
+
+def weaken_etag(headers: MutableHeaders):
+    etag = headers.get("etag")
+    if etag and not etag.startswith("W/"):
+        headers["ETag"] = f"W/{etag}"
+
+
+def negotiate(header: str, encodings: List[str]) -> Optional[str]:
+    accepted = parse_accept_encoding(header)
+    wildcard = accepted.get("*", 0.0)
+    for encoding in encodings:
+        if accepted.get(encoding, wildcard) > 0:
+            return encoding
+    return None
+
+
+class Compressor:
+    """Interfaz común compress()/flush() sobre zlib, brotli y zstandard"""
+    def __init__(self, encoding: str, level: int):
+        self.encoding = encoding
+        if encoding == "gzip":
+            self._compressor = zlib.compressobj(min(max(level, 1), 9), zlib.DEFLATED, 31)
+        elif encoding == "br":
+            self._compressor = brotli.Compressor(quality=min(max(level, 0), 11))
+        else:
+            self._compressor = zstandard.ZstdCompressor(level=min(max(level, 1), 22)).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.process(data)
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = 1024, level: int = 5):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.level = level
+        self.encodings = available_encodings()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""), self.encodings)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await CompressionResponder(self.app, encoding, self.minimum_size, self.level)(scope, receive, send)
+
+
+class CompressionResponder:
+    def __init__(self, app, encoding: str, minimum_size: int, level: int):
+        self.app = app
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.level = level
+        self.send = None
+        self.start_message = None
+        self.compressor: Optional[Compressor] = None
+        self.passthrough = False
+
+    async def __call__(self, scope, receive, send):
+        self.send = send
+        await self.app(scope, receive, self.send_wrapper)
+
+    def should_compress(self, headers: Headers) -> bool:
+        if "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "")
+        return content_type.startswith(COMPRESSIBLE_TYPES) or "+json" in content_type
+
+    async def send_wrapper(self, message):
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            if message["status"] == 304:
+                weaken_etag(MutableHeaders(raw=message["headers"]))
+                self.passthrough = True
+                await self.send(message)
+                return
+            # Se retiene hasta ver el primer fragmento del cuerpo
+            self.start_message = message
+            self.passthrough = not self.should_compress(Headers(raw=message["headers"]))
+            if not self.passthrough:
+                MutableHeaders(raw=message["headers"]).add_vary_header("Accept-Encoding")
+            return
+        if message_type != "http.response.body":
+            await self.send(message)
+            return
+
+        if self.passthrough:
+            if self.start_message is not None:
+                await self.send(self.start_message)
+                self.start_message = None
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.start_message is not None:
+            headers = MutableHeaders(raw=self.start_message["headers"])
+            if not more_body and len(body) < self.minimum_size:
+                self.passthrough = True
+                await self.send(self.start_message)
+                self.start_message = None
+                await self.send(message)
+                return
+            headers["Content-Encoding"] = self.encoding
+            weaken_etag(headers)
+            self.compressor = Compressor(self.encoding, self.level)
+            if not more_body:
+                compressed = self.compressor.compress(body) + self.compressor.flush()
+                headers["Content-Length"] = str(len(compressed))
+                await self.send(self.start_message)
+                self.start_message = None
+                await self.send({"type": "http.response.body", "body": compressed})
+                return
+            del headers["Content-Length"]
+            await self.send(self.start_message)
+            self.start_message = None
+
+        chunk = self.compressor.compress(body)
+        if not more_body:
+            chunk += self.compressor.flush()
+        await self.send({"type": "http.response.body", "body": chunk, "more_body": more_body})
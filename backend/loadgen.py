@@ -0,0 +1,444 @@
+"""
+Generador de carga para la API.
+
+Levanta (o usa) un uvicorn local contra un mongod local, siembra centros,
+psicólogos, pacientes, anamnesis, citas y pagos a través de la propia API, y
+lanza una carga mixta con N clientes concurrentes durante un tiempo fijo. Al
+final imprime, por endpoint, número de peticiones, errores, throughput y
+latencias p50/p95/p99/max.
+
+Con --spawn-server (por defecto) el servidor usa una base de datos propia
+(<DB_NAME>_loadgen) que se elimina al terminar, salvo que se indique --keep.
+
+--seed-mode api siembra a través de los endpoints (lento, pero recorre el mismo
+código que el frontend); --seed-mode direct escribe con seed_data.py directamente
+en MongoDB antes de arrancar el servidor, para volúmenes grandes, y la carga usa
+una muestra de los psicólogos sembrados.
+
+Uso (desde el directorio backend):
+    python loadgen.py run --duration 60 --concurrency 50
+    python loadgen.py run --seed-mode direct --psychologists 20000 --patients-per-psychologist 100
+    python loadgen.py run --no-spawn-server --base-url http://127.0.0.1:8001
+"""
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+import typer
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+import seed_data  # noqa: E402 (importa server, que necesita el .env cargado)
+
+cli = typer.Typer(help="Psychology Practice Management System - load generator")
+
+LOADGEN_DB_NAME = f"{os.environ['DB_NAME']}_loadgen"
+SUPER_ADMIN_EMAIL = "admin@psychologyportal.com"
+SUPER_ADMIN_PASSWORD = "admin123"
+SEED_PASSWORD = "loadgen-password"
+
+
+@dataclass
+class Account:
+    id: str
+    role: str
+    token: str
+    center_id: Optional[str] = None
+    patient_ids: List[str] = field(default_factory=list)
+    anamnesis_patient_ids: List[str] = field(default_factory=list)
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.token}"}
+
+
+def percentile(latencies: List[float], fraction: float) -> float:
+    return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))]
+
+
+class LoadClient:
+    """Cliente httpx que mide cada petición y la agrupa por endpoint"""
+    def __init__(self, base_url: str, concurrency: int):
+        self.http = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=30.0,
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+        )
+        # Durante la siembra un fallo de red aborta; en warmup y medición solo se cuenta
+        self.seeding = False
+        self.recording = False
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    async def request(self, label: str, method: str, url: str, account: Optional[Account] = None,
+                      expected: Tuple[int, ...] = (200,), **kwargs) -> httpx.Response:
+        headers = account.headers if account else None
+        start = time.perf_counter()
+        try:
+            response = await self.http.request(method, url, headers=headers, **kwargs)
+            failed = response.status_code not in expected
+        except httpx.HTTPError:
+            response = None
+            failed = True
+        elapsed = (time.perf_counter() - start) * 1000
+        if self.recording:
+            self.latencies.setdefault(label, []).append(elapsed)
+            if failed:
+                self.errors[label] = self.errors.get(label, 0) + 1
+        if response is None and self.seeding:
+            raise RuntimeError(f"{method} {url} failed during seeding")
+        return response
+
+    async def close(self):
+        await self.http.aclose()
+
+
+async def login(client: LoadClient, email: str, password: str) -> Dict[str, Any]:
+    response = await client.request("POST /api/auth/login", "POST", "/api/auth/login",
+                                    json={"email": email, "password": password})
+    response.raise_for_status()
+    return response.json()
+
+
+async def gather_limited(concurrency: int, jobs: List[Callable[[], Any]]) -> List[Any]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(job):
+        async with semaphore:
+            return await job()
+
+    return await asyncio.gather(*(run(job) for job in jobs))
+
+
+async def seed_via_api(client: LoadClient, rng: random.Random, centers: int, psychologists: int,
+                       patients_per_psychologist: int, appointments_per_patient: int, payments_per_patient: int,
+                       anamnesis_fraction: float, concurrency: int) -> List[Account]:
+    """Siembra datos llamando a los endpoints, como lo haría el frontend"""
+    await client.request("POST /api/init/super-admin", "POST", "/api/init/super-admin", expected=(200, 400))
+    admin_login = await login(client, SUPER_ADMIN_EMAIL, SUPER_ADMIN_PASSWORD)
+    admin = Account(admin_login["user"]["id"], "super_admin", admin_login["access_token"])
+    run_id = f"{int(time.time())}{rng.randrange(1000)}"
+
+    async def create_center(index: int):
+        response = await client.request("POST /api/centers", "POST", "/api/centers", admin,
+                                        json={"name": f"Centro {index}", "address": f"Av. Principal {index}"})
+        response.raise_for_status()
+        return response.json()["id"]
+
+    center_ids = await gather_limited(concurrency, [lambda i=i: create_center(i) for i in range(centers)])
+
+    async def create_user(index: int, role: str, center_id: Optional[str]) -> Account:
+        email = f"{role}.{run_id}.{index}@loadgen.example.com"
+        response = await client.request("POST /api/users", "POST", "/api/users", admin, json={
+            "username": f"{role}_{run_id}_{index}",
+            "email": email,
+            "first_name": "Carga",
+            "last_name": str(index),
+            "password": SEED_PASSWORD,
+            "role": role,
+            "center_id": center_id,
+        })
+        response.raise_for_status()
+        user_login = await login(client, email, SEED_PASSWORD)
+        return Account(user_login["user"]["id"], role, user_login["access_token"], center_id)
+
+    jobs = [lambda i=i, c=center_id: create_user(i, "center_admin", c) for i, center_id in enumerate(center_ids)]
+    jobs += [lambda i=i: create_user(i, "psychologist", rng.choice(center_ids) if center_ids else None)
+             for i in range(psychologists)]
+    accounts = await gather_limited(concurrency, jobs)
+
+    async def create_patient(account: Account, index: int):
+        first_name, last_name = f"Paciente{index}", rng.choice(["García", "Rodríguez", "Quispe", "Flores"])
+        response = await client.request("POST /api/patients", "POST", "/api/patients", account, json={
+            "first_name": first_name,
+            "last_name": last_name,
+            "phone": f"9{rng.randrange(10**8):08d}",
+            "date_of_birth": f"{rng.randrange(1960, 2020)}-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d}",
+            "gender": rng.choice(["M", "F"]),
+        })
+        response.raise_for_status()
+        patient_id = response.json()["id"]
+        account.patient_ids.append(patient_id)
+        if rng.random() < anamnesis_fraction:
+            response = await client.request("POST /api/patients/{patient_id}/anamnesis", "POST",
+                                            f"/api/patients/{patient_id}/anamnesis", account,
+                                            json=seed_data.anamnesis_payload(rng, first_name, last_name))
+            response.raise_for_status()
+            account.anamnesis_patient_ids.append(patient_id)
+        today = datetime.now()
+        for _ in range(appointments_per_patient):
+            day = (today + timedelta(days=rng.randrange(-60, 60))).strftime("%Y-%m-%d")
+            await client.request("POST /api/appointments", "POST", "/api/appointments", account, json={
+                "patient_id": patient_id,
+                "appointment_date": day,
+                "appointment_time": f"{rng.randrange(8, 20):02d}:00",
+            })
+        for _ in range(payments_per_patient):
+            day = (today - timedelta(days=rng.randrange(120))).strftime("%Y-%m-%d")
+            await client.request("POST /api/payments", "POST", "/api/payments", account, json={
+                "patient_id": patient_id,
+                "amount": float(rng.randrange(30, 150)),
+                "payment_date": day,
+                "session_date": day,
+                "payment_method": rng.choice(["cash", "card", "transfer"]),
+            })
+
+    psychologist_accounts = [account for account in accounts if account.role == "psychologist"]
+    await gather_limited(concurrency, [
+        lambda a=account, i=i: create_patient(a, i)
+        for account in psychologist_accounts for i in range(patients_per_psychologist)
+    ])
+    return accounts
+
+
+async def accounts_from_seed(client: LoadClient, rng: random.Random, centers: int, psychologists: int,
+                             sample: int, concurrency: int) -> List[Account]:
+    """Inicia sesión con una muestra de los usuarios de seed_data y carga sus pacientes"""
+    async def sign_in(email: str, role: str) -> Account:
+        user_login = await login(client, email, seed_data.SEED_PASSWORD)
+        account = Account(user_login["user"]["id"], role, user_login["access_token"], user_login["user"].get("center_id"))
+        if role == "psychologist":
+            response = await client.request("GET /api/patients", "GET", "/api/patients", account, params={"limit": 200})
+            response.raise_for_status()
+            for patient in response.json():
+                account.patient_ids.append(patient["id"])
+                if patient.get("anamnesis"):
+                    account.anamnesis_patient_ids.append(patient["id"])
+        return account
+
+    jobs = [lambda i=i: sign_in(seed_data.psychologist_email(i), "psychologist")
+            for i in rng.sample(range(psychologists), min(sample, psychologists))]
+    jobs += [lambda i=i: sign_in(seed_data.center_admin_email(i), "center_admin")
+             for i in rng.sample(range(centers), min(max(1, sample // 10), centers))]
+    return await gather_limited(concurrency, jobs)
+
+
+def workload(rng: random.Random, accounts: List[Account]) -> List[Tuple[int, Callable]]:
+    """Operaciones de la carga mixta con su peso relativo"""
+    psychologists = [account for account in accounts if account.role == "psychologist" and account.patient_ids]
+    center_admins = [account for account in accounts if account.role == "center_admin"]
+    with_anamnesis = [account for account in psychologists if account.anamnesis_patient_ids]
+    today = datetime.now()
+
+    def week_range() -> Dict[str, str]:
+        start = today + timedelta(days=rng.randrange(-30, 30))
+        return {"start_date": start.strftime("%Y-%m-%d"), "end_date": (start + timedelta(days=7)).strftime("%Y-%m-%d")}
+
+    async def list_patients(client: LoadClient):
+        account = rng.choice(psychologists + center_admins)
+        await client.request("GET /api/patients", "GET", "/api/patients", account, params={"limit": 50})
+
+    async def get_patient(client: LoadClient):
+        account = rng.choice(psychologists)
+        await client.request("GET /api/patients/{patient_id}", "GET",
+                             f"/api/patients/{rng.choice(account.patient_ids)}", account)
+
+    async def get_anamnesis(client: LoadClient):
+        account = rng.choice(with_anamnesis or psychologists)
+        patient_id = rng.choice(account.anamnesis_patient_ids or account.patient_ids)
+        await client.request("GET /api/patients/{patient_id}/anamnesis", "GET",
+                             f"/api/patients/{patient_id}/anamnesis", account, expected=(200, 404))
+
+    async def list_appointments(client: LoadClient):
+        account = rng.choice(psychologists)
+        await client.request("GET /api/appointments", "GET", "/api/appointments", account, params=week_range())
+
+    async def create_appointment(client: LoadClient):
+        account = rng.choice(psychologists)
+        await client.request("POST /api/appointments", "POST", "/api/appointments", account, json={
+            "patient_id": rng.choice(account.patient_ids),
+            "appointment_date": (today + timedelta(days=rng.randrange(60))).strftime("%Y-%m-%d"),
+            "appointment_time": f"{rng.randrange(8, 20):02d}:00",
+        })
+
+    async def list_payments(client: LoadClient):
+        account = rng.choice(psychologists)
+        await client.request("GET /api/payments", "GET", "/api/payments", account, params={"limit": 100})
+
+    async def payment_stats(client: LoadClient):
+        account = rng.choice(psychologists + center_admins)
+        await client.request("GET /api/payments/stats", "GET", "/api/payments/stats", account)
+
+    async def create_payment(client: LoadClient):
+        account = rng.choice(psychologists)
+        day = today.strftime("%Y-%m-%d")
+        await client.request("POST /api/payments", "POST", "/api/payments", account, json={
+            "patient_id": rng.choice(account.patient_ids),
+            "amount": float(rng.randrange(30, 150)),
+            "payment_date": day,
+            "session_date": day,
+        })
+
+    async def list_session_objectives(client: LoadClient):
+        account = rng.choice(psychologists)
+        await client.request("GET /api/session-objectives", "GET", "/api/session-objectives", account)
+
+    async def me(client: LoadClient):
+        account = rng.choice(accounts)
+        await client.request("GET /api/auth/me", "GET", "/api/auth/me", account)
+
+    return [
+        (20, list_patients),
+        (20, get_patient),
+        (10, get_anamnesis),
+        (15, list_appointments),
+        (5, create_appointment),
+        (10, list_payments),
+        (10, payment_stats),
+        (5, create_payment),
+        (5, list_session_objectives),
+        (5, me),
+    ]
+
+
+async def drive(client: LoadClient, operations: List[Tuple[int, Callable]], rng: random.Random,
+                concurrency: int, duration: float, warmup: float) -> float:
+    """Carga en lazo cerrado: cada cliente lanza la siguiente operación al terminar la anterior"""
+    weights = [weight for weight, _ in operations]
+    functions = [operation for _, operation in operations]
+    deadline = time.monotonic() + warmup + duration
+
+    async def worker():
+        while time.monotonic() < deadline:
+            await rng.choices(functions, weights)[0](client)
+
+    async def start_recording():
+        await asyncio.sleep(warmup)
+        client.recording = True
+        return time.monotonic()
+
+    recording_start, *_ = await asyncio.gather(start_recording(), *(worker() for _ in range(concurrency)))
+    return time.monotonic() - recording_start
+
+
+def print_report(client: LoadClient, elapsed: float):
+    typer.echo(f"\n{'endpoint':<46}{'count':>8}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    total = 0
+    for label, latencies in sorted(client.latencies.items()):
+        latencies.sort()
+        total += len(latencies)
+        typer.echo(
+            f"{label:<46}{len(latencies):>8}{client.errors.get(label, 0):>8}{len(latencies) / elapsed:>9.1f}"
+            f"{percentile(latencies, 0.50):>9.1f}{percentile(latencies, 0.95):>9.1f}"
+            f"{percentile(latencies, 0.99):>9.1f}{latencies[-1]:>9.1f}"
+        )
+    typer.echo(f"\nTotal: {total} requests in {elapsed:.1f}s ({total / elapsed:.1f} req/s), "
+               f"{sum(client.errors.values())} errors")
+
+
+async def wait_until_ready(base_url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as http:
+        while time.monotonic() < deadline:
+            try:
+                await http.get("/metrics")
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not start in {timeout}s")
+
+
+def spawn_server(port: int, workers: int) -> subprocess.Popen:
+    env = {**os.environ, "DB_NAME": LOADGEN_DB_NAME}
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+        cwd=ROOT_DIR, env=env,
+    )
+
+
+@cli.command()
+def run(
+    base_url: str = typer.Option("http://127.0.0.1:8001", help="API base URL"),
+    spawn_server_: bool = typer.Option(True, "--spawn-server/--no-spawn-server",
+                                       help="Start a local uvicorn on a throwaway database"),
+    workers: int = typer.Option(1, help="uvicorn workers when spawning the server"),
+    seed_mode: str = typer.Option("api", help="api: seed through the endpoints; direct: write with seed_data.py"),
+    accounts: int = typer.Option(50, help="Psychologists signed in for the load in direct seed mode"),
+    centers: int = typer.Option(5, help="Centers to seed"),
+    psychologists: int = typer.Option(50, help="Psychologists to seed"),
+    patients_per_psychologist: int = typer.Option(40, help="Patients created by each psychologist"),
+    appointments_per_patient: int = typer.Option(2, help="Appointments per patient"),
+    payments_per_patient: int = typer.Option(3, help="Payments per patient"),
+    anamnesis_fraction: float = typer.Option(0.3, help="Fraction of patients with a full anamnesis"),
+    concurrency: int = typer.Option(50, help="Concurrent clients"),
+    duration: float = typer.Option(60, help="Measured seconds of mixed load"),
+    warmup: float = typer.Option(5, help="Seconds of load discarded before measuring"),
+    seed: int = typer.Option(42, help="Random seed for data and workload"),
+    keep: bool = typer.Option(False, help="Keep the load-test database"),
+):
+    """Siembra datos y mide la API bajo una carga mixta"""
+    if seed_mode not in ("api", "direct"):
+        raise typer.BadParameter("seed-mode must be 'api' or 'direct'")
+    if seed_mode == "direct" and not spawn_server_:
+        raise typer.BadParameter("--seed-mode direct writes to the spawned server's database; use --spawn-server")
+
+    async def main():
+        rng = random.Random(seed)
+        mongo = None
+        server = None
+        client = None
+        try:
+            if spawn_server_:
+                mongo = AsyncIOMotorClient(os.environ['MONGO_URL'])
+                await mongo.drop_database(LOADGEN_DB_NAME)
+                if seed_mode == "direct":
+                    typer.echo("Seeding with seed_data...")
+                    start = time.perf_counter()
+                    await seed_data.seed(mongo[LOADGEN_DB_NAME], seed_data.SeedConfig(
+                        seed=seed,
+                        reference_date=date.today(),
+                        centers=centers,
+                        psychologists=psychologists,
+                        patients_per_psychologist=patients_per_psychologist,
+                        anamnesis_fraction=anamnesis_fraction,
+                        appointments_per_patient=appointments_per_patient,
+                        payments_per_patient=payments_per_patient,
+                    ))
+                    typer.echo(f"Seeded in {time.perf_counter() - start:.1f}s")
+                server = spawn_server(httpx.URL(base_url).port or 8001, workers)
+            client = LoadClient(base_url, concurrency)
+            await wait_until_ready(base_url)
+            client.seeding = True
+            if seed_mode == "direct":
+                seeded_accounts = await accounts_from_seed(client, rng, centers, psychologists, accounts, concurrency)
+            else:
+                typer.echo("Seeding through the API...")
+                start = time.perf_counter()
+                seeded_accounts = await seed_via_api(client, rng, centers, psychologists, patients_per_psychologist,
+                                                     appointments_per_patient, payments_per_patient,
+                                                     anamnesis_fraction, concurrency)
+                typer.echo(f"Seeded in {time.perf_counter() - start:.1f}s")
+            client.seeding = False
+
+            typer.echo(f"Running mixed load: {concurrency} clients, {warmup:.0f}s warmup + {duration:.0f}s...")
+            elapsed = await drive(client, workload(rng, seeded_accounts), rng, concurrency, duration, warmup)
+            print_report(client, elapsed)
+        finally:
+            # Se limpia también si la siembra falla antes de arrancar el servidor
+            if client is not None:
+                await client.close()
+            if server is not None:
+                server.terminate()
+                server.wait()
+            if mongo is not None:
+                if not keep:
+                    await mongo.drop_database(LOADGEN_DB_NAME)
+                mongo.close()
+
+    asyncio.run(main())
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,95 @@
+"""
+Monitor del event loop.
+
+LoopLagMonitor es una tarea asyncio que duerme `interval` segundos y mide cuánto
+tarda de más en despertar: ese retraso (lag) es el tiempo que otros callbacks
+tuvieron ocupado el loop. Se publica como histograma de Prometheus.
+
+Con `watchdog=True` arranca además un hilo que vigila el último tick de la tarea;
+si el loop lleva más de `block_threshold_ms` sin atenderlo, toma la pila del hilo
+del loop con sys._current_frames() y la escribe en el log, para saber qué código
+síncrono lo bloqueó (bcrypt, construcción de modelos, I/O bloqueante...).
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+from prometheus_client import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds", "Delay of the event loop in running a scheduled callback",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+EVENT_LOOP_BLOCKED = Counter(
+    "event_loop_blocked_total", "Times the watchdog saw the event loop blocked past the threshold"
+)
+
+
+class LoopLagMonitor:
+    def __init__(self, interval: float, block_threshold_ms: float, watchdog: bool = False):
+        self.interval = interval
+        self.block_threshold = block_threshold_ms / 1000
+        self.watchdog = watchdog
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog_thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._loop_thread_id: Optional[int] = None
+        self._last_tick = time.monotonic()
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_tick = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._run())
+        if self.watchdog:
+            self._watchdog_thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._watchdog_thread.start()
+
+    async def stop(self):
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._watchdog_thread is not None:
+            await asyncio.to_thread(self._watchdog_thread.join)
+            self._watchdog_thread = None
+
+    async def _run(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self._last_tick = now
+            EVENT_LOOP_LAG.observe(lag)
+            if lag >= self.block_threshold:
+                logger.warning("Event loop lag: %.0f ms", lag * 1000)
+
+    def _watch(self):
+        """Hilo vigilante: una sola muestra de pila por cada bloqueo"""
+        reported_tick = None
+        poll = min(self.interval, self.block_threshold) / 2
+        while not self._stopped.wait(poll):
+            last_tick = self._last_tick
+            blocked_for = time.monotonic() - last_tick - self.interval
+            if blocked_for < self.block_threshold or reported_tick == last_tick:
+                continue
+            reported_tick = last_tick
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            EVENT_LOOP_BLOCKED.inc()
+            stack = "".join(traceback.format_stack(frame))
+            logger.warning("Event loop blocked for more than %.0f ms at:\n%s", blocked_for * 1000, stack)
@@ -0,0 +1,109 @@
+"""
+Comandos de mantenimiento del backend.
+
+Uso (desde el directorio backend):
+    python manage.py sync-indexes --dry-run
+    python manage.py rebuild-patient-directory
+    python manage.py rebuild-payment-rollups
+    python manage.py migrate-clinical-notes --batch-size 100
+    python manage.py backfill-session-objectives
+"""
+import asyncio
+import json
+
+import typer
+
+from server import (
+    backfill_session_objective_owners,
+    client,
+    ensure_indexes,
+    log_index_report,
+    migrate_embedded_clinical_notes,
+    rebuild_patient_directory,
+    rebuild_payment_rollups,
+)
+
+cli = typer.Typer(help="Psychology Practice Management System - maintenance commands")
+
+
+@cli.command("sync-indexes")
+def sync_indexes(
+    dry_run: bool = typer.Option(False, help="Only report drift, do not create or replace indexes"),
+    replace_changed: bool = typer.Option(False, help="Drop and recreate indexes whose definition differs"),
+):
+    """Crea los índices declarados que falten y reporta las diferencias"""
+    async def run():
+        report = await ensure_indexes(dry_run=dry_run, replace_changed=replace_changed, include_tenants=True)
+        log_index_report(report)
+        typer.echo(json.dumps(report, indent=2))
+
+    try:
+        asyncio.run(run())
+    finally:
+        client.close()
+
+
+@cli.command("rebuild-patient-directory")
+def rebuild_directory(
+    batch_size: int = typer.Option(1000, help="Directory entries written per bulk operation"),
+):
+    """Reconstruye patient_directory desde todas las colecciones de pacientes"""
+    async def run():
+        await ensure_indexes()
+        entries = await rebuild_patient_directory(batch_size)
+        typer.echo(f"patient_directory rebuilt: {entries} entries")
+
+    try:
+        asyncio.run(run())
+    finally:
+        client.close()
+
+
+@cli.command("rebuild-payment-rollups")
+def rebuild_rollups():
+    """Recalcula payment_daily_rollups desde la colección payments"""
+    async def run():
+        await ensure_indexes()
+        rows = await rebuild_payment_rollups()
+        typer.echo(f"payment_daily_rollups rebuilt: {rows} rows")
+
+    try:
+        asyncio.run(run())
+    finally:
+        client.close()
+
+
+@cli.command("migrate-clinical-notes")
+def migrate_clinical_notes(
+    batch_size: int = typer.Option(100, help="Patients processed per batch"),
+):
+    """Mueve evaluaciones y notas de progreso embebidas a sus propias colecciones"""
+    async def run():
+        await ensure_indexes()
+        moved = await migrate_embedded_clinical_notes(batch_size)
+        typer.echo(f"Moved {moved['evaluations']} evaluations and {moved['progress_notes']} progress notes")
+
+    try:
+        asyncio.run(run())
+    finally:
+        client.close()
+
+
+@cli.command("backfill-session-objectives")
+def backfill_session_objectives(
+    batch_size: int = typer.Option(1000, help="Objectives updated per batch"),
+):
+    """Copia psychologist_id y center_id del paciente a los objetivos de sesión"""
+    async def run():
+        await ensure_indexes()
+        updated = await backfill_session_objective_owners(batch_size)
+        typer.echo(f"Session objectives updated: {updated}")
+
+    try:
+        asyncio.run(run())
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    cli()
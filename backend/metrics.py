@@ -0,0 +1,117 @@
+"""
+Métricas de Prometheus del backend.
+
+- PrometheusMiddleware: middleware ASGI puro (sin BaseHTTPMiddleware, que crea una
+  tarea por petición) con número de peticiones, latencia, peticiones en curso y
+  tamaño de respuesta, etiquetados por plantilla de ruta y código de estado.
+- MongoCommandMetrics: CommandListener de pymongo con la duración de cada comando,
+  etiquetada con la ruta que lo originó.
+- RouteContextRoute: clase de ruta que guarda la plantilla en `current_route`,
+  para que el listener (y cualquier otro código) sepa qué endpoint está activo.
+  Motor copia el contexto al ejecutar pymongo en su pool de hilos.
+
+Las métricas se exponen en GET /metrics.
+"""
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi.routing import APIRoute
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from pymongo import monitoring
+from starlette.responses import Response
+
+# Plantilla de la ruta en curso ("/api/patients/{patient_id}"), None fuera de una petición
+current_route: ContextVar[Optional[str]] = ContextVar("current_route", default=None)
+
+UNMATCHED_ROUTE = "unmatched"   # 404 y rutas sin plantilla, para no crear una serie por URL
+BACKGROUND_ROUTE = "background"  # Comandos lanzados fuera de una petición (workers, startup)
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests handled", ["method", "route", "status"]
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ["method", "route"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "HTTP requests currently being handled", ["method"]
+)
+HTTP_RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes", "HTTP response body size", ["route"],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304),
+)
+MONGODB_COMMAND_DURATION = Histogram(
+    "mongodb_command_duration_seconds", "MongoDB command latency", ["command", "route", "status"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+
+
+class RouteContextRoute(APIRoute):
+    """APIRoute que publica su plantilla en `current_route` antes de resolver dependencias"""
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        path = self.path_format
+
+        async def route_handler(request):
+            current_route.set(path)
+            return await handler(request)
+
+        return route_handler
+
+
+class PrometheusMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+        response_size = 0
+
+        async def send_wrapper(message):
+            nonlocal status_code, response_size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                response_size += len(message.get("body", b""))
+            await send(message)
+
+        in_progress = HTTP_REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            in_progress.dec()
+            # FastAPI deja la ruta resuelta en el scope
+            route = scope.get("route")
+            route = getattr(route, "path_format", None) or UNMATCHED_ROUTE
+            HTTP_REQUESTS.labels(method, route, str(status_code)).inc()
+            HTTP_REQUEST_DURATION.labels(method, route).observe(duration)
+            HTTP_RESPONSE_SIZE.labels(route).observe(response_size)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGODB_COMMAND_DURATION.labels(
+            event.command_name, current_route.get() or BACKGROUND_ROUTE, "succeeded"
+        ).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        MONGODB_COMMAND_DURATION.labels(
+            event.command_name, current_route.get() or BACKGROUND_ROUTE, "failed"
+        ).observe(event.duration_micros / 1e6)
+
+
+def metrics_response() -> Response:
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
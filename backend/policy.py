@@ -0,0 +1,123 @@
+"""
+Políticas de acceso.
+
+Cada política traduce un par (usuario, recurso) en un fragmento de filtro de
+MongoDB, que los endpoints añaden a su consulta para que la base de datos solo
+devuelva o modifique documentos autorizados. `matches` evalúa ese mismo filtro
+sobre un documento ya cargado, como las entradas de patient_directory en caché.
+
+El módulo no depende de server.py ni de la base de datos, así que se puede
+probar y medir por separado.
+"""
+from typing import Any, Callable, Dict, Iterable
+
+# Recursos
+PATIENT = "patient"            # Pacientes y sus entradas en patient_directory
+PATIENT_LIST = "patient_list"  # Listado de pacientes: suma los compartidos y los del contexto
+OWNED_RECORD = "owned_record"  # Citas y pagos, que guardan el psychologist_id del autor
+RECORD_LIST = "record_list"    # Listados y estadísticas de citas y pagos
+
+SUPER_ADMIN = "super_admin"
+CENTER_ADMIN = "center_admin"
+PSYCHOLOGIST = "psychologist"
+
+
+class AccessDenied(Exception):
+    """El usuario no tiene acceso a ningún documento del recurso"""
+
+
+def _require_center(user, resource: str):
+    # Sin centro asignado {"center_id": None} abarcaría los documentos sin centro
+    if user.center_id is None:
+        raise AccessDenied(resource)
+
+
+def _patient_filter(user, **context) -> Dict[str, Any]:
+    if user.role == PSYCHOLOGIST:
+        return {"psychologist_id": user.id}
+    if user.role == CENTER_ADMIN:
+        _require_center(user, PATIENT)
+        return {"center_id": user.center_id}
+    return {}
+
+
+def _patient_list_filter(user, **context) -> Dict[str, Any]:
+    if user.role == PSYCHOLOGIST:
+        return {"$or": [
+            {"psychologist_id": user.id},
+            {"shared_with": user.id},
+            {"database_context": user.id},
+        ]}
+    if user.role == CENTER_ADMIN:
+        _require_center(user, PATIENT_LIST)
+        return {"$or": [{"center_id": user.center_id}, {"database_context": user.center_id}]}
+    return {}
+
+
+def _owned_record_filter(user, **context) -> Dict[str, Any]:
+    if user.role == PSYCHOLOGIST:
+        return {"psychologist_id": user.id}
+    return {}
+
+
+def _record_list_filter(user, center_psychologist_ids: Iterable[str] = (), **context) -> Dict[str, Any]:
+    if user.role == PSYCHOLOGIST:
+        return {"psychologist_id": user.id}
+    if user.role == CENTER_ADMIN:
+        _require_center(user, RECORD_LIST)
+        return {"psychologist_id": {"$in": [*center_psychologist_ids, user.id]}}
+    return {}
+
+
+POLICIES: Dict[str, Callable[..., Dict[str, Any]]] = {
+    PATIENT: _patient_filter,
+    PATIENT_LIST: _patient_list_filter,
+    OWNED_RECORD: _owned_record_filter,
+    RECORD_LIST: _record_list_filter,
+}
+
+
+def compile_filter(user, resource: str, **context) -> Dict[str, Any]:
+    """
+    Devuelve el filtro que restringe `resource` a lo que `user` puede ver.
+    Un filtro vacío significa acceso a todo el recurso. `context` lleva los datos
+    que la política no puede consultar por sí misma, como los psicólogos del
+    centro (center_psychologist_ids) para RECORD_LIST.
+    """
+    try:
+        policy = POLICIES[resource]
+    except KeyError:
+        raise ValueError(f"Unknown resource: {resource}")
+    if user.role not in (SUPER_ADMIN, CENTER_ADMIN, PSYCHOLOGIST):
+        raise AccessDenied(resource)
+    return policy(user, **context)
+
+
+def matches(filter_: Dict[str, Any], document: Dict[str, Any]) -> bool:
+    """
+    Evalúa un filtro de compile_filter sobre un documento en memoria. Solo admite
+    igualdad, $in y $or, que es lo que generan las políticas. Como en MongoDB, un
+    campo lista coincide si alguno de sus elementos coincide.
+    """
+    for field, expected in filter_.items():
+        if field == "$or":
+            if not any(matches(branch, document) for branch in expected):
+                return False
+            continue
+        value = document.get(field)
+        candidates = value if isinstance(value, list) else [value]
+        if isinstance(expected, dict):
+            if set(expected) != {"$in"}:
+                raise ValueError(f"Unsupported operator in policy filter: {expected}")
+            if not any(candidate in expected["$in"] for candidate in candidates):
+                return False
+        elif expected not in candidates:
+            return False
+    return True
+
+
+def allows(user, resource: str, document: Dict[str, Any]) -> bool:
+    try:
+        return matches(compile_filter(user, resource), document)
+    except AccessDenied:
+        return False
@@ -0,0 +1,81 @@
+"""
+Profiler por muestreo.
+
+Un hilo muestreador despierta cada `interval` segundos, recorre las pilas de
+todos los hilos del proceso con sys._current_frames() y cuenta cada pila. No usa
+sys.setprofile ni settrace, así que el código perfilado no paga nada entre
+muestras; el coste es el del propio hilo, proporcional a la frecuencia.
+
+Las muestras son de tiempo real, no de CPU: cuando el event loop está ocioso
+aparece esperando en select(), lo que permite ver también el peso de la espera.
+
+El resultado está en formato "collapsed stacks" (una línea por pila, frames
+separados por ";" y el número de muestras al final), que aceptan flamegraph.pl,
+speedscope e inferno. Se permite un perfil a la vez por proceso.
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict
+
+
+class ProfilerBusy(Exception):
+    """Ya hay un perfil en curso en este proceso"""
+
+
+def frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def collapse(samples: Dict[str, int]) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in sorted(samples.items()))
+
+
+def sample_stacks(duration: float, interval: float) -> Dict[str, int]:
+    """Muestrea todos los hilos salvo el actual durante `duration` segundos"""
+    samples: Counter = Counter()
+    own_thread_id = threading.get_ident()
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        time.sleep(interval)
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_thread_id:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame))
+                frame = frame.f_back
+            stack.append(thread_names.get(thread_id, str(thread_id)))
+            samples[";".join(reversed(stack))] += 1
+    return samples
+
+
+class SamplingProfiler:
+    def __init__(self):
+        self._running = False
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    async def profile(self, seconds: float, interval: float) -> str:
+        # Comprobar y marcar sin await entre medias: no hace falta lock en el loop
+        if self._running:
+            raise ProfilerBusy()
+        self._running = True
+
+        def run() -> Dict[str, int]:
+            # Se libera desde el hilo: si se cancela la petición el muestreo sigue
+            # hasta `seconds` y no debe poder arrancar otro perfil en paralelo
+            try:
+                return sample_stacks(seconds, interval)
+            finally:
+                self._running = False
+
+        samples = await asyncio.to_thread(run)
+        return collapse(samples)
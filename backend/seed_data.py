@@ -0,0 +1,524 @@
+"""
+Generador determinista de datos sintéticos.
+
+Con la misma semilla y la misma fecha de referencia produce exactamente los
+mismos documentos (ids incluidos): cada centro y cada psicólogo usa su propio
+generador aleatorio derivado de la semilla, así que el resultado no depende del
+orden en que se escriban los lotes.
+
+Los documentos tienen la forma de los modelos de server.py (Center, User,
+Patient con su anamnesis, Appointment, Payment, SessionObjective); el primero
+de cada tipo se valida contra su modelo antes de escribir. Los pacientes van a
+la colección de su tenant (patients_<database_context>) y a patient_directory,
+igual que los crea la API. Se escriben con insert_many desordenado por lotes
+desde varias tareas concurrentes; los índices y payment_daily_rollups se
+construyen al final, que es más rápido que mantenerlos durante la carga.
+
+Todos los usuarios sembrados tienen la contraseña SEED_PASSWORD.
+
+Uso (desde el directorio backend):
+    python seed_data.py --db-name psychology_scale --centers 1000 --psychologists 20000 --patients-per-psychologist 100
+"""
+import asyncio
+import os
+import random
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import date, datetime, time as dt_time, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import typer
+
+from server import (
+    AnamnesisCreate,
+    Appointment,
+    Center,
+    Patient,
+    Payment,
+    SessionObjective,
+    User,
+    client,
+    ensure_indexes,
+    patient_collection_name,
+    patient_directory_entry,
+    pwd_context,
+    rebuild_payment_rollups,
+)
+
+cli = typer.Typer(help="Psychology Practice Management System - synthetic data")
+
+SEED_PASSWORD = "seed-password"
+
+FIRST_NAMES = ["Ana", "Luis", "María", "José", "Lucía", "Carlos", "Sofía", "Jorge", "Valeria", "Diego",
+               "Camila", "Miguel", "Daniela", "Andrés", "Gabriela", "Fernando", "Paula", "Ricardo"]
+LAST_NAMES = ["García", "Rodríguez", "Quispe", "Flores", "Sánchez", "Ramírez", "Torres", "Mendoza",
+              "Vargas", "Castillo", "Rojas", "Chávez", "Huamán", "Gutiérrez", "Díaz", "Cruz"]
+CITIES = ["Lima", "Arequipa", "Cusco", "Trujillo", "Piura", "Chiclayo", "Iquitos", "Tacna"]
+
+
+@dataclass
+class SeedConfig:
+    seed: int = 42
+    reference_date: date = date(2025, 1, 1)
+    centers: int = 10
+    psychologists: int = 100
+    center_fraction: float = 0.7       # Psicólogos asignados a un centro
+    patients_per_psychologist: int = 50
+    shared_fraction: float = 0.3       # Pacientes de centro entre los de un psicólogo con centro
+    anamnesis_fraction: float = 0.5
+    appointments_per_patient: int = 4
+    payments_per_patient: int = 4
+    objectives_per_patient: int = 2
+    history_days: int = 365
+
+
+def seeded_uuid(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def entity_rng(config: SeedConfig, kind: str, index: int) -> random.Random:
+    return random.Random(f"{config.seed}:{kind}:{index}")
+
+
+def center_id_for(config: SeedConfig, index: int) -> str:
+    return seeded_uuid(entity_rng(config, "center", index))
+
+
+def psychologist_email(index: int) -> str:
+    return f"psychologist{index}@seed.example.com"
+
+
+def center_admin_email(index: int) -> str:
+    return f"center{index}.admin@seed.example.com"
+
+
+def anamnesis_payload(rng: random.Random, first_name: str, last_name: str, today: Optional[date] = None) -> Dict[str, Any]:
+    """Ficha completa con la forma de AnamnesisCreate"""
+    today = today or date.today()
+    age = rng.randrange(4, 17)
+    return {
+        "general_data": {
+            "patient_name": f"{first_name} {last_name}",
+            "birth_date": f"{today.year - age}-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d}",
+            "birth_place": rng.choice(CITIES),
+            "age_years": age,
+            "age_months": rng.randrange(12),
+            "education_level": rng.choice(["Inicial", "Primaria", "Secundaria"]),
+            "informants": ["Madre", "Padre"],
+            "father_data": {"name": f"{rng.choice(FIRST_NAMES)} {last_name}", "age": str(rng.randrange(28, 60)), "occupation": "Empleado"},
+            "mother_data": {"name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}", "age": str(rng.randrange(25, 55)), "occupation": "Docente"},
+            "siblings_data": [{"name": rng.choice(FIRST_NAMES), "age": str(rng.randrange(1, 20))} for _ in range(rng.randrange(3))],
+        },
+        "consultation_motive": {
+            "difficulty_presentation": "Dificultades de atención en clase",
+            "when_where_who": "Desde el inicio del año escolar, en el colegio, reportado por la docente",
+            "evolution": rng.choice(["Progresiva", "Estable", "Intermitente"]),
+            "solutions_attempted": "Refuerzo escolar en casa",
+            "perceived_cause": rng.choice(["Cambio de colegio", "Separación de los padres", "No identificada"]),
+            "treatments_received": "Ninguno",
+            "current_illness": {"onset": rng.choice(["gradual", "súbito"]), "course": "estable"},
+        },
+        "evolutionary_history": {
+            "prenatal": {"planned_pregnancy": rng.random() < 0.7, "complications": "Ninguna"},
+            "perinatal": {"delivery_type": rng.choice(["natural", "cesárea"]), "weeks": rng.randrange(36, 42)},
+            "postnatal": {"breastfeeding_months": rng.randrange(24)},
+        },
+        "medical_history": {
+            "current_health": rng.choice(["Buena", "Regular"]),
+            "main_diseases": "Ninguna",
+            "medications": "Ninguna",
+            "accidents": "Ninguno",
+            "operations": {},
+            "exams": {"vision": "Normal", "hearing": "Normal"},
+        },
+        "neuromuscular_development": {
+            "motor_milestones": {"sat": f"{rng.randrange(5, 9)} meses", "walked": f"{rng.randrange(10, 18)} meses"},
+            "difficulties": {"balance": rng.random() < 0.1, "coordination": rng.random() < 0.2},
+            "automatic_movements": {},
+            "motor_skills": {"fine": "Adecuada", "gross": "Adecuada"},
+            "lateral_dominance": rng.choice(["Diestro", "Zurdo"]),
+        },
+        "speech_history": {
+            "speech_development": {"first_words": f"{rng.randrange(9, 20)} meses", "sentences": "24 meses"},
+            "oral_movements": {"chewing": "Normal"},
+        },
+        "habits_formation": {
+            "feeding": {"appetite": rng.choice(["Bueno", "Selectivo"])},
+            "hygiene": {"toilet_training": "24 meses"},
+            "sleep": {"hours": rng.randrange(7, 11), "nightmares": rng.random() < 0.2},
+            "personal_independence": {"dresses_alone": rng.random() < 0.8},
+        },
+        "conduct": {
+            "maladaptive_behaviors": {"tantrums": rng.random() < 0.3, "aggression": rng.random() < 0.1},
+            "other_problems": "Ninguno",
+            "child_character": rng.choice(["Sociable", "Tímido", "Inquieto"]),
+        },
+        "play": {"play_preferences": {"favorite": rng.choice(["Fútbol", "Dibujo", "Videojuegos"])}, "social_play": {"with_peers": "Sí"}},
+        "educational_history": {
+            "initial_education": {"age_started": "3 años"},
+            "primary_secondary": {"performance": rng.choice(["Bueno", "Regular", "Bajo"])},
+            "learning_difficulties": {"reading": "No", "math": rng.choice(["Sí", "No"])},
+            "special_services": {},
+        },
+        "psychosexuality": {
+            "sexual_questions_age": "5 años",
+            "information_provided": "Sí",
+            "opposite_sex_friends": rng.random() < 0.8,
+            "genital_behaviors": {},
+        },
+        "parental_attitudes": {
+            "parental_reactions": ["Preocupación"],
+            "beliefs_guilt": "No",
+            "behavioral_changes": "Ninguno",
+            "punishment_use": {"type": "Retiro de privilegios"},
+            "child_behavior": {"response": "Acepta"},
+        },
+        "family_history": {
+            "psychiatric_diseases": rng.random() < 0.1,
+            "speech_problems": rng.random() < 0.1,
+            "learning_difficulties": rng.random() < 0.2,
+            "other_conditions": [],
+            "parents_character": "Tranquilos",
+            "couple_relationship": rng.choice(["Estable", "Conflictiva", "Separados"]),
+        },
+        "interview_observations": "Colaborador durante la entrevista",
+    }
+
+
+def reference_datetime(config: SeedConfig, days_ago: float = 0) -> datetime:
+    base = datetime.combine(config.reference_date, dt_time(12), tzinfo=timezone.utc)
+    return base - timedelta(days=days_ago)
+
+
+def generate_centers(config: SeedConfig, created_by: str) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+    for index in range(config.centers):
+        rng = entity_rng(config, "center", index)
+        center_id = seeded_uuid(rng)
+        created_at = reference_datetime(config, rng.randrange(config.history_days))
+        admin_id = seeded_uuid(rng)
+        yield "centers", [{
+            "id": center_id,
+            "name": f"Centro {rng.choice(CITIES)} {index}",
+            "description": "Centro de atención psicológica",
+            "address": f"Av. Principal {rng.randrange(100, 2000)}",
+            "phone": f"01{rng.randrange(10**6):06d}",
+            "email": f"center{index}@seed.example.com",
+            "admin_id": admin_id,
+            "psychologists": [],
+            "database_name": f"center_{index}_{center_id[:8]}",
+            "is_active": True,
+            "created_by": created_by,
+            "created_at": created_at,
+            "updated_at": created_at,
+        }]
+        yield "users", [{
+            "id": admin_id,
+            "username": f"center_admin_{index}",
+            "email": center_admin_email(index),
+            "first_name": rng.choice(FIRST_NAMES),
+            "last_name": rng.choice(LAST_NAMES),
+            "password": None,  # Se completa al escribir
+            "role": "center_admin",
+            "center_id": center_id,
+            "phone": None,
+            "specialization": None,
+            "license_number": None,
+            "email_verified": True,
+            "is_active": True,
+            "created_at": created_at,
+            "updated_at": created_at,
+        }]
+
+
+def generate_psychologist(config: SeedConfig, index: int) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+    """Un psicólogo con sus pacientes, citas, pagos y objetivos de sesión"""
+    rng = entity_rng(config, "psychologist", index)
+    psychologist_id = seeded_uuid(rng)
+    center_id = None
+    if config.centers and rng.random() < config.center_fraction:
+        center_id = center_id_for(config, rng.randrange(config.centers))
+    created_at = reference_datetime(config, config.history_days + rng.randrange(365))
+    yield "users", [{
+        "id": psychologist_id,
+        "username": f"psychologist_{index}",
+        "email": psychologist_email(index),
+        "first_name": rng.choice(FIRST_NAMES),
+        "last_name": rng.choice(LAST_NAMES),
+        "password": None,  # Se completa al escribir
+        "role": "psychologist",
+        "center_id": center_id,
+        "phone": f"9{rng.randrange(10**8):08d}",
+        "specialization": rng.choice(["Clínica", "Infantil", "Educativa", "Familiar"]),
+        "license_number": f"CPsP-{rng.randrange(10**5):05d}",
+        "database_name": f"psychologist_psychologist_{index}_{psychologist_id[:8]}",
+        "email_verified": True,
+        "is_active": True,
+        "created_at": created_at,
+        "updated_at": created_at,
+    }]
+
+    patients: Dict[str, List[Dict[str, Any]]] = {}
+    directory, appointments, payments, objectives = [], [], [], []
+    for _ in range(config.patients_per_psychologist):
+        patient_id = seeded_uuid(rng)
+        shared = center_id is not None and rng.random() < config.shared_fraction
+        database_context = center_id if shared else psychologist_id
+        first_name, last_name = rng.choice(FIRST_NAMES), f"{rng.choice(LAST_NAMES)} {rng.choice(LAST_NAMES)}"
+        patient_created_at = reference_datetime(config, rng.randrange(config.history_days))
+        patient = {
+            "id": patient_id,
+            "first_name": first_name,
+            "last_name": last_name,
+            "email": None,
+            "phone": f"9{rng.randrange(10**8):08d}",
+            "date_of_birth": f"{rng.randrange(1950, 2020)}-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d}",
+            "gender": rng.choice(["M", "F"]),
+            "address": f"Jr. {rng.choice(LAST_NAMES)} {rng.randrange(100, 999)}, {rng.choice(CITIES)}",
+            "emergency_contact": {"name": rng.choice(FIRST_NAMES), "phone": f"9{rng.randrange(10**8):08d}"},
+            "psychologist_id": psychologist_id,
+            "center_id": center_id if shared else None,
+            "patient_type": "shared" if shared else "individual",
+            "shared_with": [psychologist_id] if shared else [],
+            "database_context": database_context,
+            "clinical_history": None,
+            "evaluations": [],
+            "diagnosis": None,
+            "progress_notes": [],
+            "anamnesis": None,
+            "notes": None,
+            "is_active": True,
+            "created_at": patient_created_at,
+            "updated_at": patient_created_at,
+        }
+        if rng.random() < config.anamnesis_fraction:
+            anamnesis = anamnesis_payload(rng, first_name, last_name, config.reference_date)
+            anamnesis.update({
+                "patient_id": patient_id,
+                "history_number": f"HCL-{patient_id[-8:]}",
+                "creation_date": patient_created_at.strftime("%Y-%m-%d"),
+                "created_by": psychologist_id,
+                "created_at": patient_created_at,
+                "updated_at": patient_created_at,
+            })
+            patient["anamnesis"] = anamnesis
+        collection_name = patient_collection_name(database_context)
+        patients.setdefault(collection_name, []).append(patient)
+        directory.append(patient_directory_entry(patient, collection_name))
+
+        for _ in range(config.appointments_per_patient):
+            day = config.reference_date + timedelta(days=rng.randrange(-config.history_days, 60))
+            status = "scheduled" if day >= config.reference_date else rng.choice(["completed", "completed", "cancelled", "no_show"])
+            appointment_created_at = reference_datetime(config, max(0, (config.reference_date - day).days) + 7)
+            appointments.append({
+                "id": seeded_uuid(rng),
+                "patient_id": patient_id,
+                "psychologist_id": psychologist_id,
+                "appointment_date": day.strftime("%Y-%m-%d"),
+                "appointment_time": f"{rng.randrange(8, 20):02d}:{rng.choice(['00', '30'])}",
+                "duration_minutes": rng.choice([45, 60, 90]),
+                "appointment_type": rng.choice(["consultation", "therapy", "evaluation"]),
+                "status": status,
+                "notes": None,
+                "session_objectives": [],
+                "created_by": psychologist_id,
+                "created_at": appointment_created_at,
+                "updated_at": appointment_created_at,
+            })
+
+        for _ in range(config.payments_per_patient):
+            day = config.reference_date - timedelta(days=rng.randrange(config.history_days))
+            payments.append({
+                "id": seeded_uuid(rng),
+                "patient_id": patient_id,
+                "appointment_id": None,
+                "psychologist_id": psychologist_id,
+                "center_id": center_id if shared else None,
+                "amount": float(rng.randrange(30, 150)),
+                "payment_date": day.strftime("%Y-%m-%d"),
+                "session_date": day.strftime("%Y-%m-%d"),
+                "payment_method": rng.choice(["cash", "card", "transfer"]),
+                "status": rng.choice(["completed"] * 9 + ["pending"]),
+                "notes": None,
+                "created_by": psychologist_id,
+                "created_at": datetime.combine(day, dt_time(12), tzinfo=timezone.utc),
+            })
+
+        for _ in range(config.objectives_per_patient):
+            day = config.reference_date - timedelta(days=rng.randrange(config.history_days))
+            week_start = day - timedelta(days=day.weekday())
+            objective_created_at = datetime.combine(week_start, dt_time(12), tzinfo=timezone.utc)
+            objectives.append({
+                "id": seeded_uuid(rng),
+                "patient_id": patient_id,
+                "psychologist_id": psychologist_id,
+                "center_id": center_id if shared else None,
+                "appointment_id": None,
+                "week_start_date": week_start.strftime("%Y-%m-%d"),
+                "objective_title": rng.choice(["Registro de emociones", "Técnicas de respiración", "Rutina de sueño"]),
+                "objective_description": "Practicar diariamente y anotar observaciones",
+                "status": rng.choice(["pending", "in_progress", "completed"]),
+                "priority": rng.choice(["low", "medium", "high"]),
+                "target_date": (week_start + timedelta(days=6)).strftime("%Y-%m-%d"),
+                "completion_notes": None,
+                "created_by": psychologist_id,
+                "created_at": objective_created_at,
+                "updated_at": objective_created_at,
+            })
+
+    for collection_name, documents in patients.items():
+        yield collection_name, documents
+    yield "patient_directory", directory
+    yield "appointments", appointments
+    yield "payments", payments
+    yield "session_objectives", objectives
+
+
+MODELS = {
+    "centers": Center,
+    "users": User,
+    "appointments": Appointment,
+    "payments": Payment,
+    "session_objectives": SessionObjective,
+}
+
+
+def validate_document(collection_name: str, document: Dict[str, Any]):
+    """Falla si el documento no tiene la forma del modelo de server.py"""
+    if collection_name.startswith("patients"):
+        Patient(**document)
+        if document.get("anamnesis"):
+            AnamnesisCreate(**document["anamnesis"])
+    elif collection_name in MODELS:
+        MODELS[collection_name](**document)
+
+
+async def seed(database, config: SeedConfig, batch_size: int = 1000, writers: int = 8,
+               super_admin_id: Optional[str] = None) -> Dict[str, int]:
+    """Escribe los datos de `config` en `database` y devuelve los documentos por colección"""
+    password_hash = pwd_context.hash(SEED_PASSWORD)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=writers * 4)
+    counts: Dict[str, int] = {}
+    validated = set()
+
+    async def writer():
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            collection_name, documents = item
+            await database[collection_name].insert_many(documents, ordered=False)
+
+    async def put(item):
+        # Si un writer falla (p. ej. claves duplicadas al sembrar sobre datos
+        # existentes) nadie vaciaría la cola: se espera el put junto con los writers
+        put_task = asyncio.ensure_future(queue.put(item))
+        running = [task for task in tasks if not task.done()]
+        while True:
+            done, _ = await asyncio.wait([put_task, *running], return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task is not put_task and task.exception() is not None:
+                    put_task.cancel()
+                    raise task.exception()
+            if put_task in done:
+                return
+            running = [task for task in running if not task.done()]
+
+    async def produce(generator: Iterator[Tuple[str, List[Dict[str, Any]]]], pending: Dict[str, List[Dict[str, Any]]]):
+        for collection_name, documents in generator:
+            if collection_name not in validated and documents:
+                validate_document(collection_name, documents[0])
+                validated.add(collection_name)
+            buffer = pending.setdefault(collection_name, [])
+            for document in documents:
+                if collection_name == "users":
+                    document["password"] = password_hash
+                buffer.append(document)
+            counts[collection_name] = counts.get(collection_name, 0) + len(documents)
+            if len(buffer) >= batch_size:
+                await put((collection_name, buffer))
+                pending[collection_name] = []
+
+    tasks = [asyncio.create_task(writer()) for _ in range(writers)]
+    try:
+        pending: Dict[str, List[Dict[str, Any]]] = {}
+        await produce(generate_centers(config, super_admin_id or "seed"), pending)
+        for index in range(config.psychologists):
+            await produce(generate_psychologist(config, index), pending)
+        for collection_name, documents in pending.items():
+            if documents:
+                await put((collection_name, documents))
+        for _ in tasks:
+            await put(None)
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+    # Los psicólogos de cada centro, como los deja assign-psychologist
+    members: Dict[str, List[str]] = {}
+    async for user in database.users.find({"role": "psychologist", "center_id": {"$ne": None}}, {"_id": 0, "id": 1, "center_id": 1}):
+        members.setdefault(user["center_id"], []).append(user["id"])
+    for center_id, psychologist_ids in members.items():
+        await database.centers.update_one({"id": center_id}, {"$set": {"psychologists": psychologist_ids}})
+
+    await ensure_indexes(database, include_tenants=True)
+    await rebuild_payment_rollups(database)
+    return counts
+
+
+@cli.command()
+def main(
+    db_name: str = typer.Option(..., help="Target database; use a dedicated one, never production"),
+    seed_value: int = typer.Option(42, "--seed", help="Random seed"),
+    reference_date: str = typer.Option("2025-01-01", help="Dates are generated relative to this day (YYYY-MM-DD)"),
+    centers: int = typer.Option(10, help="Centers (each with one center admin)"),
+    psychologists: int = typer.Option(100, help="Psychologists"),
+    patients_per_psychologist: int = typer.Option(50, help="Patients per psychologist"),
+    anamnesis_fraction: float = typer.Option(0.5, help="Fraction of patients with a full anamnesis"),
+    appointments_per_patient: int = typer.Option(4, help="Appointments per patient"),
+    payments_per_patient: int = typer.Option(4, help="Payments per patient"),
+    objectives_per_patient: int = typer.Option(2, help="Session objectives per patient"),
+    batch_size: int = typer.Option(1000, help="Documents per insert_many"),
+    writers: int = typer.Option(8, help="Concurrent insert tasks"),
+    drop: bool = typer.Option(False, help="Drop the database before seeding"),
+):
+    """Siembra datos sintéticos deterministas"""
+    config = SeedConfig(
+        seed=seed_value,
+        reference_date=date.fromisoformat(reference_date),
+        centers=centers,
+        psychologists=psychologists,
+        patients_per_psychologist=patients_per_psychologist,
+        anamnesis_fraction=anamnesis_fraction,
+        appointments_per_patient=appointments_per_patient,
+        payments_per_patient=payments_per_patient,
+        objectives_per_patient=objectives_per_patient,
+    )
+
+    async def run():
+        if db_name == os.environ['DB_NAME'] and not typer.confirm(f"{db_name} is the application database. Continue?"):
+            raise typer.Abort()
+        if drop:
+            await client.drop_database(db_name)
+        elif await client[db_name].list_collection_names():
+            typer.echo(f"{db_name} is not empty; use --drop to replace its data", err=True)
+            raise typer.Exit(1)
+        start = time.perf_counter()
+        counts = await seed(client[db_name], config, batch_size, writers)
+        elapsed = time.perf_counter() - start
+        for collection_name in sorted(name for name in counts if not name.startswith("patients_")):
+            typer.echo(f"{collection_name:<24}{counts[collection_name]:>12}")
+        patients = sum(count for name, count in counts.items() if name.startswith("patients_"))
+        typer.echo(f"{'patients (all tenants)':<24}{patients:>12}")
+        typer.echo(f"\nSeeded {db_name} in {elapsed:.1f}s")
+
+    try:
+        asyncio.run(run())
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    cli()
@@ -1,21 +1,42 @@
-from fastapi import FastAPI, APIRouter, Depends, HTTPException, status
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReplaceOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, EmailStr
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, EmailStr, create_model
+from typing import List, Optional, Dict, Any, Tuple
 import uuid
 from datetime import datetime, timezone, timedelta
 import jwt
+import orjson
 from passlib.context import CryptContext
 import json
+import base64
+import hashlib
 import secrets
+import time
+import asyncio
+import threading
+import smtplib
+from email.message import EmailMessage
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from functools import lru_cache
 from enum import Enum
 
+import compression
+import loop_monitor
+import metrics
+import policy
+import profiler
+import slow_queries
+
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
@@ -27,16 +48,144 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
 
+# bcrypt se ejecuta fuera del event loop en un pool acotado
+PASSWORD_HASH_CONCURRENCY = int(os.environ.get("PASSWORD_HASH_CONCURRENCY", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_MAX_QUEUE = int(os.environ.get("PASSWORD_HASH_MAX_QUEUE", "200"))
+
+# Envío de emails mediante outbox
+# Sin SMTP_HOST los emails solo se registran en el log. Para pruebas locales se puede
+# usar aiosmtpd como servidor SMTP: python -m aiosmtpd -n -l localhost:1025
+SMTP_HOST = os.environ.get("SMTP_HOST")
+SMTP_PORT = int(os.environ.get("SMTP_PORT", "25"))
+SMTP_USERNAME = os.environ.get("SMTP_USERNAME")
+SMTP_PASSWORD = os.environ.get("SMTP_PASSWORD")
+SMTP_STARTTLS = os.environ.get("SMTP_STARTTLS", "false").lower() == "true"
+SMTP_TIMEOUT_SECONDS = float(os.environ.get("SMTP_TIMEOUT_SECONDS", "10"))
+EMAIL_FROM = os.environ.get("EMAIL_FROM", "no-reply@psychologyportal.com")
+EMAIL_OUTBOX_WORKER_ENABLED = os.environ.get("EMAIL_OUTBOX_WORKER_ENABLED", "true").lower() == "true"
+EMAIL_OUTBOX_BATCH_SIZE = int(os.environ.get("EMAIL_OUTBOX_BATCH_SIZE", "20"))
+EMAIL_OUTBOX_POLL_SECONDS = float(os.environ.get("EMAIL_OUTBOX_POLL_SECONDS", "5"))
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.environ.get("EMAIL_OUTBOX_MAX_ATTEMPTS", "5"))
+EMAIL_OUTBOX_BACKOFF_SECONDS = float(os.environ.get("EMAIL_OUTBOX_BACKOFF_SECONDS", "30"))
+EMAIL_OUTBOX_LEASE_SECONDS = float(os.environ.get("EMAIL_OUTBOX_LEASE_SECONDS", "120"))
+# Los mensajes enviados o fallidos se borran (índice TTL sobre finished_at) pasado este plazo
+EMAIL_OUTBOX_RETENTION_DAYS = int(os.environ.get("EMAIL_OUTBOX_RETENTION_DAYS", "30"))
+
+# Cache de usuarios autenticados (por proceso)
+USER_CACHE_MAX_ENTRIES = int(os.environ.get("USER_CACHE_MAX_ENTRIES", "1000"))
+USER_CACHE_TTL_SECONDS = float(os.environ.get("USER_CACHE_TTL_SECONDS", "60"))
+PATIENT_ACCESS_CACHE_MAX_ENTRIES = int(os.environ.get("PATIENT_ACCESS_CACHE_MAX_ENTRIES", "10000"))
+PATIENT_ACCESS_CACHE_TTL_SECONDS = float(os.environ.get("PATIENT_ACCESS_CACHE_TTL_SECONDS", "30"))
+CENTER_MEMBERSHIP_CACHE_MAX_ENTRIES = int(os.environ.get("CENTER_MEMBERSHIP_CACHE_MAX_ENTRIES", "1000"))
+CENTER_MEMBERSHIP_CACHE_TTL_SECONDS = float(os.environ.get("CENTER_MEMBERSHIP_CACHE_TTL_SECONDS", "60"))
+
+# Compresión de respuestas (ver compression.py); brotli y zstd solo si están instalados
+COMPRESSION_MINIMUM_SIZE = int(os.environ.get("COMPRESSION_MINIMUM_SIZE", "1024"))
+COMPRESSION_LEVEL = int(os.environ.get("COMPRESSION_LEVEL", "5"))
+
+# Registro de consultas lentas (ver slow_queries.py)
+SLOW_QUERY_ENABLED = os.environ.get("SLOW_QUERY_ENABLED", "true").lower() == "true"
+SLOW_QUERY_THRESHOLD_MS = float(os.environ.get("SLOW_QUERY_THRESHOLD_MS", "100"))
+SLOW_QUERY_FLUSH_INTERVAL_SECONDS = float(os.environ.get("SLOW_QUERY_FLUSH_INTERVAL_SECONDS", "10"))
+SLOW_QUERY_EXPLAIN_SAMPLE_RATE = float(os.environ.get("SLOW_QUERY_EXPLAIN_SAMPLE_RATE", "0.1"))
+SLOW_QUERY_CAPPED_SIZE_BYTES = int(os.environ.get("SLOW_QUERY_CAPPED_SIZE_BYTES", str(64 * 1024 * 1024)))
+
+slow_query_listener = slow_queries.SlowQueryListener(SLOW_QUERY_THRESHOLD_MS)
+slow_query_recorder = slow_queries.SlowQueryRecorder(
+    slow_query_listener, SLOW_QUERY_FLUSH_INTERVAL_SECONDS, SLOW_QUERY_EXPLAIN_SAMPLE_RATE, SLOW_QUERY_CAPPED_SIZE_BYTES
+)
+
+# Monitor del event loop (ver loop_monitor.py); el watchdog toma muestras de pila y es opcional
+LOOP_LAG_INTERVAL_SECONDS = float(os.environ.get("LOOP_LAG_INTERVAL_SECONDS", "0.5"))
+LOOP_BLOCK_THRESHOLD_MS = float(os.environ.get("LOOP_BLOCK_THRESHOLD_MS", "100"))
+LOOP_WATCHDOG_ENABLED = os.environ.get("LOOP_WATCHDOG_ENABLED", "false").lower() == "true"
+
+loop_lag_monitor = loop_monitor.LoopLagMonitor(LOOP_LAG_INTERVAL_SECONDS, LOOP_BLOCK_THRESHOLD_MS, LOOP_WATCHDOG_ENABLED)
+
+# Profiler bajo demanda (ver profiler.py)
+PROFILER_MAX_SECONDS = float(os.environ.get("PROFILER_MAX_SECONDS", "60"))
+
+sampling_profiler = profiler.SamplingProfiler()
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+event_listeners = [metrics.MongoCommandMetrics()]
+if SLOW_QUERY_ENABLED:
+    event_listeners.append(slow_query_listener)
+client = AsyncIOMotorClient(mongo_url, event_listeners=event_listeners)
 db = client[os.environ['DB_NAME']]
 
+# Respuestas JSON con orjson
+# orjson serializa datetime, UUID y Enum de forma nativa; OPT_UTC_Z mantiene el
+# formato "...Z" que producía Pydantic para fechas en UTC.
+class FastJSONResponse(ORJSONResponse):
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+
+def model_list_response(items: List[BaseModel], next_cursor: Optional[str] = None,
+                        request: Optional[Request] = None) -> Response:
+    """
+    Serializa una lista de modelos ya validados en un solo paso (model_dump + orjson),
+    sin pasar por la validación de response_model ni por jsonable_encoder.
+    Con `request` añade un ETag con el hash del contenido y responde 304 si coincide.
+    """
+    response = FastJSONResponse([item.model_dump() for item in items])
+    set_next_cursor(response, next_cursor)
+    if request is not None:
+        etag = make_etag(response.body, next_cursor)
+        if etag_matches(request, etag):
+            return not_modified(etag, next_cursor)
+        response.headers["ETag"] = etag
+    return response
+
+# ETags y peticiones condicionales
+# Los documentos usan un ETag derivado de id + updated_at, que se consulta con una
+# proyección mínima: si coincide con If-None-Match se responde 304 sin leer ni
+# serializar el documento. Los listados usan un hash del contenido. La compresión
+# convierte el ETag en débil (W/), así que la comparación es débil (RFC 9110).
+def make_etag(*parts: Any) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode())
+        digest.update(b"\0")
+    return f'"{digest.hexdigest()}"'
+
+def document_etag(document_id: str, updated_at: Optional[datetime], *variant: Any) -> Optional[str]:
+    """
+    None si el documento no tiene updated_at: sin fecha no se puede saber si cambió.
+    `variant` distingue representaciones del mismo documento (por ejemplo, ?fields=).
+    """
+    return make_etag(document_id, updated_at.isoformat(), *variant) if updated_at else None
+
+def etag_matches(request: Request, etag: Optional[str]) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header or etag is None:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque_tag = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if (candidate[2:] if candidate.startswith("W/") else candidate) == opaque_tag:
+            return True
+    return False
+
+def not_modified(etag: str, next_cursor: Optional[str] = None) -> Response:
+    response = Response(status_code=304, headers={"ETag": etag})
+    set_next_cursor(response, next_cursor)
+    return response
+
+def model_response(model: BaseModel, etag: Optional[str]) -> FastJSONResponse:
+    response = FastJSONResponse(model.model_dump())
+    if etag:
+        response.headers["ETag"] = etag
+    return response
+
 # Create the main app without a prefix
-app = FastAPI(title="Psychology Practice Management System")
+app = FastAPI(title="Psychology Practice Management System", default_response_class=FastJSONResponse)
 
 # Create a router with the /api prefix
-api_router = APIRouter(prefix="/api")
+api_router = APIRouter(prefix="/api", route_class=metrics.RouteContextRoute)
 
 # Models
 class UserRole(str, Enum):
@@ -306,6 +455,7 @@ class ClinicalHistory(BaseModel):
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class Evaluation(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     patient_id: str
     evaluation_type: str
     evaluation_date: str
@@ -325,6 +475,7 @@ class Diagnosis(BaseModel):
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class ProgressNote(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     patient_id: str
     session_date: str
     session_type: str
@@ -375,6 +526,8 @@ class AppointmentUpdate(BaseModel):
 class SessionObjective(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     patient_id: str
+    psychologist_id: Optional[str] = None  # Copiado del paciente al crear
+    center_id: Optional[str] = None        # Copiado del paciente al crear
     appointment_id: Optional[str] = None
     week_start_date: str  # YYYY-MM-DD (Monday of the week)
     objective_title: str
@@ -410,6 +563,7 @@ class Payment(BaseModel):
     patient_id: str
     appointment_id: Optional[str] = None
     psychologist_id: str
+    center_id: Optional[str] = None  # Centro del paciente al crear el pago
     amount: float
     payment_date: str  # YYYY-MM-DD
     session_date: str  # YYYY-MM-DD
@@ -428,6 +582,15 @@ class PaymentCreate(BaseModel):
     payment_method: Optional[str] = None
     notes: Optional[str] = None
 
+class PaymentUpdate(BaseModel):
+    appointment_id: Optional[str] = None
+    amount: Optional[float] = None
+    payment_date: Optional[str] = None
+    session_date: Optional[str] = None
+    payment_method: Optional[str] = None
+    status: Optional[str] = None
+    notes: Optional[str] = None
+
 # Email verification and password recovery models
 class EmailVerificationToken(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -448,12 +611,128 @@ class PasswordResetConfirm(BaseModel):
 class EmailVerificationRequest(BaseModel):
     email: EmailStr
 
+class TTLCache:
+    """
+    Cache LRU acotado con expiración por entrada.
+    Vive en el proceso: con varios workers cada uno tiene su copia, por eso el TTL
+    limita cuánto tiempo puede servirse un dato ya modificado en otro worker.
+    """
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: str, value):
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: str):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+user_cache = TTLCache(USER_CACHE_MAX_ENTRIES, USER_CACHE_TTL_SECONDS)
+patient_access_cache = TTLCache(PATIENT_ACCESS_CACHE_MAX_ENTRIES, PATIENT_ACCESS_CACHE_TTL_SECONDS)
+center_membership_cache = TTLCache(CENTER_MEMBERSHIP_CACHE_MAX_ENTRIES, CENTER_MEMBERSHIP_CACHE_TTL_SECONDS)
+
+class PasswordHasher:
+    """
+    Ejecuta hash/verify de bcrypt en un ThreadPoolExecutor dedicado (bcrypt libera
+    el GIL), de modo que una ráfaga de logins no bloquea el event loop.
+    Si la cola supera max_queue se responde 503 en lugar de acumular esperas.
+    """
+    def __init__(self, context: CryptContext, concurrency: int, max_queue: int):
+        self.context = context
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.queued = 0
+        self.active = 0
+        self.completed = 0
+        self.rejected = 0
+        self.max_queue_depth = 0
+        self.total_wait_seconds = 0.0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="password-hash")
+
+    def _run(self, enqueued_at: float, func, *args):
+        with self._lock:
+            self.queued -= 1
+            self.active += 1
+            self.total_wait_seconds += time.monotonic() - enqueued_at
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                self.active -= 1
+                self.completed += 1
+
+    async def _submit(self, func, *args):
+        with self._lock:
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise HTTPException(status_code=503, detail="Server busy, please retry")
+            self.queued += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queued)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._run, time.monotonic(), func, *args)
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(self.context.hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._submit(self.context.verify, plain_password, hashed_password)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "concurrency": self.concurrency,
+                "max_queue": self.max_queue,
+                "queued": self.queued,
+                "active": self.active,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "max_queue_depth": self.max_queue_depth,
+                "avg_wait_ms": (self.total_wait_seconds / self.completed * 1000) if self.completed else 0,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+password_hasher = PasswordHasher(pwd_context, PASSWORD_HASH_CONCURRENCY, PASSWORD_HASH_MAX_QUEUE)
+
 # Helper functions
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password, hashed_password):
+    return await password_hasher.verify(plain_password, hashed_password)
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+async def get_password_hash(password):
+    return await password_hasher.hash(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -479,10 +758,422 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     except jwt.PyJWTError:
         raise credentials_exception
     
-    user = await db.users.find_one({"id": user_id})
+    cached_user = user_cache.get(user_id)
+    if cached_user is not None:
+        return cached_user
+    
+    user = await db.users.find_one({"id": user_id}, {"_id": 0, "password": 0})
     if user is None:
         raise credentials_exception
-    return User(**user)
+    user_obj = User(**user)
+    user_cache.set(user_id, user_obj)
+    return user_obj
+
+# Índices de MongoDB
+# Cada colección declara sus índices con nombre explícito, así ensure_indexes puede
+# comparar lo declarado con lo que existe en la base y reportar diferencias (drift).
+INDEX_SPECS: Dict[str, List[Dict[str, Any]]] = {
+    "users": [
+        {"name": "id_unique", "keys": [("id", 1)], "unique": True},
+        {"name": "email_unique", "keys": [("email", 1)], "unique": True},
+        {"name": "username_unique", "keys": [("username", 1)], "unique": True,
+         "partialFilterExpression": {"username": {"$type": "string"}}},
+        {"name": "center_role", "keys": [("center_id", 1), ("role", 1)]},
+        {"name": "role", "keys": [("role", 1)]},
+    ],
+    "centers": [
+        {"name": "id_unique", "keys": [("id", 1)], "unique": True},
+    ],
+    "patients": [
+        {"name": "id_unique", "keys": [("id", 1)], "unique": True},
+        {"name": "psychologist_id", "keys": [("psychologist_id", 1)]},
+        {"name": "center_id", "keys": [("center_id", 1)]},
+        {"name": "shared_with", "keys": [("shared_with", 1)]},
+        {"name": "database_context", "keys": [("database_context", 1)]},
+    ],
+    "patient_directory": [
+        {"name": "id_unique", "keys": [("id", 1)], "unique": True},
+        {"name": "psychologist_id", "keys": [("psychologist_id", 1)]},
+        {"name": "center_id", "keys": [("center_id", 1)]},
+        {"name": "shared_with", "keys": [("shared_with", 1)]},
+        {"name": "database_context", "keys": [("database_context", 1)]},
+    ],
+    "appointments": [
+        {"name": "id_unique", "keys": [("id", 1)], "unique": True},
+        {"name": "psychologist_date", "keys": [("psychologist_id", 1), ("appointment_date", 1), ("id", 1)]},
+        {"name": "patient_date", "keys": [("patient_id", 1), ("appointment_date", 1), ("id", 1)]},
+        # Listado de un super admin: sin filtro por rol, solo el orden del cursor
+        {"name": "date", "keys": [("appointment_date", 1), ("id", 1)]},
+    ],
+    "payments": [
+        {"name": "id_unique", "keys": [("id", 1)], "unique": True},
+        {"name": "psychologist_date", "keys": [("psychologist_id", 1), ("payment_date", -1), ("id", -1)]},
+        {"name": "patient_date", "keys": [("patient_id", 1), ("payment_date", -1), ("id", -1)]},
+    ],
+    "patient_evaluations": [
+        {"name": "id_unique", "keys": [("id", 1)], "unique": True},
+        {"name": "patient_created", "keys": [("patient_id", 1), ("created_at", -1), ("id", -1)]},
+    ],
+    "patient_progress_notes": [
+        {"name": "id_unique", "keys": [("id", 1)], "unique": True},
+        {"name": "patient_created", "keys": [("patient_id", 1), ("created_at", -1), ("id", -1)]},
+    ],
+    "email_tokens": [
+        {"name": "id_unique", "keys": [("id", 1)], "unique": True},
+        {"name": "token_unique", "keys": [("token", 1)], "unique": True},
+        # MongoDB elimina los tokens vencidos (expireAfterSeconds=0 sobre expires_at)
+        {"name": "expires_at_ttl", "keys": [("expires_at", 1)], "expireAfterSeconds": 0},
+    ],
+    "email_outbox": [
+        {"name": "id_unique", "keys": [("id", 1)], "unique": True},
+        {"name": "status_next_attempt", "keys": [("status", 1), ("next_attempt_at", 1)]},
+        {"name": "status_lease", "keys": [("status", 1), ("lease_expires_at", 1)]},
+        # Solo los mensajes terminados tienen finished_at; los pendientes no caducan
+        {"name": "finished_at_ttl", "keys": [("finished_at", 1)],
+         "expireAfterSeconds": EMAIL_OUTBOX_RETENTION_DAYS * 24 * 3600},
+    ],
+    "payment_daily_rollups": [
+        {"name": "psychologist_center_day_unique", "keys": [("psychologist_id", 1), ("center_id", 1), ("day", 1)], "unique": True},
+        {"name": "center_day", "keys": [("center_id", 1), ("day", 1)]},
+    ],
+    "session_objectives": [
+        {"name": "id_unique", "keys": [("id", 1)], "unique": True},
+        {"name": "patient_created", "keys": [("patient_id", 1), ("created_at", -1), ("id", -1)]},
+        {"name": "patient_week", "keys": [("patient_id", 1), ("week_start_date", 1)]},
+        {"name": "psychologist_created", "keys": [("psychologist_id", 1), ("created_at", -1), ("id", -1)]},
+        {"name": "center_created", "keys": [("center_id", 1), ("created_at", -1), ("id", -1)]},
+        {"name": "psychologist_week", "keys": [("psychologist_id", 1), ("week_start_date", 1)]},
+    ],
+}
+
+INDEX_OPTION_NAMES = ("unique", "partialFilterExpression", "expireAfterSeconds")
+
+def _normalize_index_keys(keys) -> List[tuple]:
+    return [(field, int(direction) if isinstance(direction, (int, float)) else direction) for field, direction in keys]
+
+def _index_options(definition: Dict[str, Any]) -> Dict[str, Any]:
+    options = {name: definition[name] for name in INDEX_OPTION_NAMES if definition.get(name) is not None}
+    if not options.get("unique"):
+        options.pop("unique", None)
+    return options
+
+async def reconcile_collection_indexes(collection, specs: List[Dict[str, Any]], dry_run: bool = False, replace_changed: bool = False) -> Dict[str, List[str]]:
+    """
+    Crea los índices declarados que falten en una colección.
+    Los índices existentes con el mismo nombre pero distinta definición solo se
+    reemplazan con replace_changed=True; los no declarados se reportan como extra.
+    """
+    report = {"created": [], "unchanged": [], "changed": [], "extra": [], "failed": []}
+    existing = await collection.index_information()
+    declared_names = {spec["name"] for spec in specs}
+
+    for spec in specs:
+        keys = _normalize_index_keys(spec["keys"])
+        options = _index_options(spec)
+        current = existing.get(spec["name"])
+        if current is not None:
+            if _normalize_index_keys(current["key"]) == keys and _index_options(current) == options:
+                report["unchanged"].append(spec["name"])
+                continue
+            report["changed"].append(spec["name"])
+            if dry_run or not replace_changed:
+                continue
+            await collection.drop_index(spec["name"])
+        elif dry_run:
+            report["created"].append(spec["name"])
+            continue
+
+        try:
+            await collection.create_index(keys, name=spec["name"], **options)
+            if current is None:
+                report["created"].append(spec["name"])
+        except OperationFailure as e:
+            report["failed"].append(f"{spec['name']}: {e}")
+
+    report["extra"] = [name for name in existing if name != "_id_" and name not in declared_names]
+    return report
+
+async def ensure_indexes(database=None, dry_run: bool = False, replace_changed: bool = False,
+                         include_tenants: bool = False) -> Dict[str, Dict[str, List[str]]]:
+    """Reconcilia los índices de todas las colecciones declaradas en INDEX_SPECS"""
+    database = database if database is not None else db
+    report = {}
+    for collection_name, specs in INDEX_SPECS.items():
+        report[collection_name] = await reconcile_collection_indexes(
+            database[collection_name], specs, dry_run=dry_run, replace_changed=replace_changed
+        )
+    # Colecciones de pacientes por tenant (patients_<database_context>). Recorrerlas
+    # crece con el número de tenants, así que solo se hace desde manage.py; en el
+    # servidor TenantRouter las reconcilia al usarlas por primera vez.
+    if not include_tenants:
+        return report
+    for collection_name in await list_patient_collections(database, include_legacy=False):
+        report[collection_name] = await reconcile_collection_indexes(
+            database[collection_name], INDEX_SPECS["patients"], dry_run=dry_run, replace_changed=replace_changed
+        )
+    return report
+
+def log_index_report(report: Dict[str, Dict[str, List[str]]]):
+    for collection_name, result in report.items():
+        if result["created"]:
+            logger.info("Indexes created on %s: %s", collection_name, ", ".join(result["created"]))
+        if result["changed"]:
+            logger.warning("Index drift on %s (definition differs): %s", collection_name, ", ".join(result["changed"]))
+        if result["extra"]:
+            logger.warning("Index drift on %s (not declared): %s", collection_name, ", ".join(result["extra"]))
+        for failure in result["failed"]:
+            logger.error("Index creation failed on %s: %s", collection_name, failure)
+
+# Paginación por cursor (keyset)
+# Cada listado se ordena por un campo indexado más "id" como desempate; el cursor
+# codifica los valores del último documento devuelto, así cada página cuesta lo mismo
+# sin importar cuántas se hayan recorrido antes. El siguiente cursor viaja en la
+# cabecera X-Next-Cursor para mantener el cuerpo de la respuesta como una lista.
+DEFAULT_PAGE_SIZE = int(os.environ.get("DEFAULT_PAGE_SIZE", "1000"))
+MAX_PAGE_SIZE = int(os.environ.get("MAX_PAGE_SIZE", "1000"))
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(document: Dict[str, Any], sort_field: str) -> str:
+    value = document.get(sort_field)
+    if isinstance(value, datetime):
+        value = {"$date": value.isoformat()}
+    payload = json.dumps({"v": value, "id": document["id"]}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        value = payload["v"]
+        if isinstance(value, dict) and "$date" in value:
+            value = datetime.fromisoformat(value["$date"])
+        return value, payload["id"]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def find_page(collection, query: Dict[str, Any], sort_field: str = "id", direction: int = 1,
+                    limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None, projection: Optional[Dict[str, Any]] = None):
+    """Devuelve (documentos, siguiente_cursor) para una página ordenada por sort_field e id"""
+    operator = "$gt" if direction == 1 else "$lt"
+    if cursor:
+        value, last_id = decode_cursor(cursor)
+        if sort_field == "id":
+            keyset = {"id": {operator: last_id}}
+        else:
+            keyset = {"$or": [{sort_field: {operator: value}}, {sort_field: value, "id": {operator: last_id}}]}
+        query = {"$and": [query, keyset]} if query else keyset
+    
+    sort = [("id", direction)] if sort_field == "id" else [(sort_field, direction), ("id", direction)]
+    documents = await collection.find(query, projection).sort(sort).limit(limit + 1).to_list(limit + 1)
+    
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        next_cursor = encode_cursor(documents[-1], sort_field)
+    return documents, next_cursor
+
+def set_next_cursor(response: Response, next_cursor: Optional[str]):
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+
+# Enrutamiento de pacientes por tenant
+# Cada paciente vive en patients_<database_context> (el centro o el psicólogo dueño).
+# patient_directory es el índice global: por cada paciente guarda la colección donde
+# vive y sus campos de propiedad, así permisos y listados se resuelven sin recorrer
+# todas las colecciones. Los pacientes antiguos de "patients" siguen accesibles.
+LEGACY_PATIENT_COLLECTION = "patients"
+PATIENT_DIRECTORY_FIELDS = ("id", "psychologist_id", "center_id", "shared_with", "database_context")
+
+def patient_collection_name(database_context: Optional[str]) -> str:
+    return f"patients_{database_context}" if database_context else LEGACY_PATIENT_COLLECTION
+
+async def list_patient_collections(database, include_legacy: bool = True) -> List[str]:
+    """Colecciones de pacientes existentes; cada tenant se puede recorrer por separado"""
+    pattern = "^patients(_|$)" if include_legacy else "^patients_"
+    return sorted(await database.list_collection_names(filter={"name": {"$regex": pattern}}))
+
+def patient_directory_entry(patient: Dict[str, Any], collection_name: str) -> Dict[str, Any]:
+    entry = {field: patient.get(field) for field in PATIENT_DIRECTORY_FIELDS}
+    entry["collection"] = collection_name
+    return entry
+
+class TenantRouter:
+    """
+    Resuelve y guarda los handles de las colecciones de pacientes de cada tenant.
+    La primera vez que un proceso usa una colección se reconcilian sus índices, así
+    cada tenant queda indexado por separado sin depender del arranque.
+    """
+    def __init__(self, database):
+        self.database = database
+        self._collections: Dict[str, Any] = {}
+
+    async def collection(self, name: str):
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections[name] = self.database[name]
+            try:
+                await reconcile_collection_indexes(collection, INDEX_SPECS[LEGACY_PATIENT_COLLECTION])
+            except Exception:
+                logger.exception("Could not reconcile indexes for %s", name)
+        return collection
+
+tenant_router = TenantRouter(db)
+
+async def patient_collection(access: Dict[str, Any]):
+    return await tenant_router.collection(access.get("collection") or LEGACY_PATIENT_COLLECTION)
+
+async def fetch_patients(entries: List[Dict[str, Any]], projection: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """Lee los pacientes de una página del directorio, agrupando por colección"""
+    ids_by_collection: Dict[str, List[str]] = {}
+    for entry in entries:
+        ids_by_collection.setdefault(entry.get("collection") or LEGACY_PATIENT_COLLECTION, []).append(entry["id"])
+    
+    async def fetch(collection_name: str, ids: List[str]):
+        collection = await tenant_router.collection(collection_name)
+        return await collection.find({"id": {"$in": ids}}, projection).to_list(len(ids))
+    
+    results = await asyncio.gather(*(fetch(name, ids) for name, ids in ids_by_collection.items()))
+    by_id = {patient["id"]: patient for patients in results for patient in patients}
+    return [by_id[entry["id"]] for entry in entries if entry["id"] in by_id]
+
+# Selección de campos de pacientes (?fields=)
+# Acepta un preset o una lista separada por comas; se traduce en la proyección de
+# MongoDB y en un modelo Pydantic con solo esos campos (mismos tipos que Patient).
+# Sin `fields` se devuelve el paciente completo, como antes.
+PATIENT_FIELD_PRESETS = {
+    "summary": ("id", "first_name", "last_name", "psychologist_id", "center_id", "patient_type", "is_active"),
+    "detail": tuple(Patient.model_fields),
+}
+
+def parse_patient_fields(fields: Optional[str]) -> Tuple[str, ...]:
+    if not fields:
+        return PATIENT_FIELD_PRESETS["detail"]
+    if fields in PATIENT_FIELD_PRESETS:
+        return PATIENT_FIELD_PRESETS[fields]
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested - set(Patient.model_fields)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown patient fields: {', '.join(sorted(unknown))}")
+    # Orden del modelo, con id siempre incluido
+    return tuple(field for field in Patient.model_fields if field in requested or field == "id")
+
+def patient_projection(fields: Tuple[str, ...]) -> Dict[str, int]:
+    return {"_id": 0, **{field: 1 for field in fields}}
+
+@lru_cache(maxsize=128)
+def patient_fields_model(fields: Tuple[str, ...]) -> type:
+    if fields == PATIENT_FIELD_PRESETS["detail"]:
+        return Patient
+    return create_model(
+        f"Patient_{'_'.join(fields)}",
+        **{field: (Patient.model_fields[field].annotation, Patient.model_fields[field]) for field in fields},
+    )
+
+async def rebuild_patient_directory(batch_size: int = 1000, database=None) -> int:
+    """Reconstruye patient_directory recorriendo todas las colecciones de pacientes"""
+    database = database if database is not None else db
+    projection = {"_id": 0, **{field: 1 for field in PATIENT_DIRECTORY_FIELDS}}
+    total = 0
+    for collection_name in await list_patient_collections(database):
+        operations = []
+        async for patient in database[collection_name].find({}, projection):
+            entry = patient_directory_entry(patient, collection_name)
+            operations.append(UpdateOne({"id": entry["id"]}, {"$set": entry}, upsert=True))
+            if len(operations) >= batch_size:
+                await database.patient_directory.bulk_write(operations, ordered=False)
+                total += len(operations)
+                operations = []
+        if operations:
+            await database.patient_directory.bulk_write(operations, ordered=False)
+            total += len(operations)
+    return total
+
+# Consulta liviana de pacientes para verificar permisos
+# La mayoría de los endpoints solo necesita saber a quién pertenece el paciente,
+# así que se lee la entrada del directorio y no la anamnesis ni las notas.
+# La caché de cada proceso solo sirve para ubicar la colección del paciente: si se
+# reasigna desde otro worker la entrada queda vieja hasta su TTL, así que el permiso
+# se decide siempre con el filtro dentro de la consulta.
+PATIENT_ACCESS_PROJECTION = {"_id": 0, "collection": 1, **{field: 1 for field in PATIENT_DIRECTORY_FIELDS}}
+
+async def get_patient_access(patient_id: str) -> Optional[Dict[str, Any]]:
+    patient = patient_access_cache.get(patient_id)
+    if patient is None:
+        patient = await db.patient_directory.find_one({"id": patient_id}, PATIENT_ACCESS_PROJECTION)
+        if patient is None:
+            # Pacientes antiguos que aún no están en el directorio
+            legacy = await db[LEGACY_PATIENT_COLLECTION].find_one({"id": patient_id}, PATIENT_ACCESS_PROJECTION)
+            if legacy is not None:
+                patient = patient_directory_entry(legacy, LEGACY_PATIENT_COLLECTION)
+                await db.patient_directory.update_one({"id": patient_id}, {"$set": patient}, upsert=True)
+        if patient is not None:
+            patient_access_cache.set(patient_id, patient)
+    return patient
+
+def permission_filter(current_user: User, resource: str, **context) -> Dict[str, Any]:
+    """Filtro de MongoDB con los documentos de `resource` accesibles (ver policy.py)"""
+    try:
+        return policy.compile_filter(current_user, resource, **context)
+    except policy.AccessDenied:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+def patient_permission_filter(current_user: User) -> Dict[str, Any]:
+    return permission_filter(current_user, policy.PATIENT)
+
+async def raise_not_found_or_denied(collection, document_id: str, not_found_detail: str):
+    """
+    Se llama cuando un find_one_and_update con el permiso en el filtro no encontró
+    nada: distingue entre documento inexistente (404) y sin acceso (403).
+    """
+    if await collection.find_one({"id": document_id}, {"_id": 1}) is None:
+        raise HTTPException(status_code=404, detail=not_found_detail)
+    raise HTTPException(status_code=403, detail="Access denied")
+
+async def authorize_patient(patient_id: str, current_user: User, check_permissions: bool = True) -> Dict[str, Any]:
+    """
+    Devuelve los campos de propiedad del paciente o lanza 404/403.
+    Con check_permissions=False solo ubica al paciente (puede venir de la caché) y el
+    llamador debe poner el permiso en su propia consulta.
+    """
+    patient = await get_patient_access(patient_id)
+    if not patient:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    if check_permissions:
+        # Propietario actual leído del directorio, sin pasar por la caché
+        patient = await db.patient_directory.find_one(
+            {"id": patient_id, **patient_permission_filter(current_user)}, PATIENT_ACCESS_PROJECTION
+        )
+        if patient is None:
+            raise HTTPException(status_code=403, detail="Access denied")
+    return patient
+
+# Psicólogos de cada centro
+# Los listados de un admin de centro filtran por los psicólogos del centro; la lista
+# se guarda en memoria y se invalida cuando se crean, editan, desactivan o asignan usuarios.
+async def get_center_psychologist_ids(center_id: Optional[str]) -> List[str]:
+    if center_id is None:
+        # {"center_id": None} devolvería todos los psicólogos sin centro
+        return []
+    cache_key = center_id
+    psychologist_ids = center_membership_cache.get(cache_key)
+    if psychologist_ids is None:
+        psychologists = await db.users.find(
+            {"center_id": center_id, "role": UserRole.PSYCHOLOGIST}, {"_id": 0, "id": 1}
+        ).to_list(None)
+        psychologist_ids = [p["id"] for p in psychologists]
+        center_membership_cache.set(cache_key, psychologist_ids)
+    return list(psychologist_ids)
+
+def invalidate_center_membership(*center_ids: Optional[str]):
+    for center_id in center_ids:
+        if center_id is not None:
+            center_membership_cache.invalidate(center_id)
+
+async def record_list_filter(current_user: User) -> Dict[str, Any]:
+    """Filtro de los listados y estadísticas de citas y pagos (policy.RECORD_LIST)"""
+    center_psychologist_ids: List[str] = []
+    if current_user.role == UserRole.CENTER_ADMIN and current_user.center_id is not None:
+        center_psychologist_ids = await get_center_psychologist_ids(current_user.center_id)
+    return permission_filter(current_user, policy.RECORD_LIST, center_psychologist_ids=center_psychologist_ids)
 
 def require_role(required_roles: List[str]):
     def role_checker(current_user: User = Depends(get_current_user)):
@@ -499,7 +1190,7 @@ def require_role(required_roles: List[str]):
 @api_router.post("/auth/login", response_model=Token)
 async def login_user(user_data: UserLogin):
     user = await db.users.find_one({"email": user_data.email})
-    if not user or not verify_password(user_data.password, user["password"]):
+    if not user or not await verify_password(user_data.password, user["password"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -528,19 +1219,154 @@ async def login_user(user_data: UserLogin):
 async def get_current_user_info(current_user: User = Depends(get_current_user)):
     return current_user
 
-# Función para enviar emails (mock - reemplazar con servicio real)
+# Función para enviar emails
 async def send_email(to_email: str, subject: str, body: str):
     """
-    Mock email function - reemplazar con servicio de email real
-    Por ahora solo imprime el email en los logs
+    Encola el email en email_outbox y vuelve de inmediato.
+    La entrega la hace EmailOutboxWorker en segundo plano, con reintentos.
     """
-    print(f"=== EMAIL MOCKUP ===")
-    print(f"To: {to_email}")
-    print(f"Subject: {subject}")
-    print(f"Body: {body}")
-    print(f"===================")
+    now = datetime.now(timezone.utc)
+    await db.email_outbox.insert_one({
+        "id": str(uuid.uuid4()),
+        "to": to_email,
+        "subject": subject,
+        "body": body,
+        "status": "pending",      # pending, sending, sent, failed
+        "attempts": 0,
+        "next_attempt_at": now,
+        "lease_expires_at": None,
+        "last_error": None,
+        "created_at": now,
+        "sent_at": None,
+    })
+    email_outbox_worker.wake()
     return True
 
+def deliver_email_batch(messages: List[Dict[str, Any]]) -> Dict[str, Optional[str]]:
+    """
+    Entrega un lote por una sola conexión SMTP (se ejecuta en un hilo).
+    Devuelve, por id de mensaje, None si se entregó o el texto del error.
+    """
+    if not SMTP_HOST:
+        for message in messages:
+            logger.info("EMAIL MOCKUP - To: %s | Subject: %s\n%s", message["to"], message["subject"], message["body"])
+        return {message["id"]: None for message in messages}
+    
+    results: Dict[str, Optional[str]] = {}
+    try:
+        with smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT_SECONDS) as smtp:
+            if SMTP_STARTTLS:
+                smtp.starttls()
+            if SMTP_USERNAME:
+                smtp.login(SMTP_USERNAME, SMTP_PASSWORD or "")
+            for message in messages:
+                email = EmailMessage()
+                email["From"] = EMAIL_FROM
+                email["To"] = message["to"]
+                email["Subject"] = message["subject"]
+                email.set_content(message["body"])
+                try:
+                    smtp.send_message(email)
+                    results[message["id"]] = None
+                except smtplib.SMTPException as e:
+                    results[message["id"]] = str(e)
+    except (OSError, smtplib.SMTPException) as e:
+        for message in messages:
+            results.setdefault(message["id"], f"SMTP connection failed: {e}")
+    return results
+
+def email_outbox_update(message: Dict[str, Any], error: Optional[str], now: datetime) -> Dict[str, Any]:
+    """Campos a fijar en un mensaje reclamado según el resultado de su entrega"""
+    if error is None:
+        return {"status": "sent", "sent_at": now, "finished_at": now, "lease_expires_at": None, "last_error": None}
+    if message["attempts"] >= EMAIL_OUTBOX_MAX_ATTEMPTS:
+        return {"status": "failed", "finished_at": now, "lease_expires_at": None, "last_error": error}
+    delay = EMAIL_OUTBOX_BACKOFF_SECONDS * 2 ** (message["attempts"] - 1)
+    return {"status": "pending", "next_attempt_at": now + timedelta(seconds=delay),
+            "lease_expires_at": None, "last_error": error}
+
+class EmailOutboxWorker:
+    """
+    Tarea asyncio que reclama mensajes de email_outbox por lotes y los entrega.
+    Cada mensaje se reclama con find_one_and_update y un lease, así varios workers
+    de uvicorn pueden convivir; si un proceso muere con mensajes en "sending", se
+    reintentan al vencer el lease. Los fallos se reintentan con backoff exponencial
+    hasta EMAIL_OUTBOX_MAX_ATTEMPTS y luego quedan en "failed".
+    """
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def start(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _claim_batch(self) -> List[Dict[str, Any]]:
+        now = datetime.now(timezone.utc)
+        claimable = {"$or": [
+            {"status": "pending", "next_attempt_at": {"$lte": now}},
+            {"status": "sending", "lease_expires_at": {"$lte": now}},
+        ]}
+        batch = []
+        while len(batch) < EMAIL_OUTBOX_BATCH_SIZE:
+            message = await db.email_outbox.find_one_and_update(
+                claimable,
+                {"$set": {"status": "sending", "lease_expires_at": now + timedelta(seconds=EMAIL_OUTBOX_LEASE_SECONDS)},
+                 "$inc": {"attempts": 1}},
+                sort=[("next_attempt_at", 1)],
+                return_document=ReturnDocument.AFTER,
+            )
+            if message is None:
+                break
+            batch.append(message)
+        return batch
+
+    async def _record_results(self, batch: List[Dict[str, Any]], results: Dict[str, Optional[str]]):
+        now = datetime.now(timezone.utc)
+        operations = []
+        for message in batch:
+            update = email_outbox_update(message, results.get(message["id"], "Not delivered"), now)
+            if update["status"] == "failed":
+                logger.error("Email %s to %s failed permanently: %s", message["id"], message["to"], update["last_error"])
+            operations.append(UpdateOne({"id": message["id"]}, {"$set": update}))
+        if operations:
+            await db.email_outbox.bulk_write(operations, ordered=False)
+
+    async def _run(self):
+        while True:
+            try:
+                batch = await self._claim_batch()
+                if batch:
+                    results = await asyncio.to_thread(deliver_email_batch, batch)
+                    await self._record_results(batch, results)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Email outbox worker iteration failed")
+            
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=EMAIL_OUTBOX_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+email_outbox_worker = EmailOutboxWorker()
+
 # Auth endpoints con validación de email
 @api_router.post("/auth/register")
 async def register_user(user_data: UserCreate, current_user: User = Depends(get_current_user)):
@@ -582,15 +1408,18 @@ async def register_user(user_data: UserCreate, current_user: User = Depends(get_
     
     return {"message": "User created successfully. Verification email sent."}
 
+async def consume_email_token(token: str, token_type: str) -> Optional[Dict[str, Any]]:
+    """Marca el token como usado y lo devuelve en un solo round-trip, o None si no es válido"""
+    now = datetime.now(timezone.utc)
+    return await db.email_tokens.find_one_and_update(
+        {"token": token, "token_type": token_type, "used": False, "expires_at": {"$gt": now}},
+        {"$set": {"used": True, "used_at": now}},
+    )
+
 @api_router.post("/auth/verify-email")
 async def verify_email(token: str):
     """Verificar email con token"""
-    token_obj = await db.email_tokens.find_one({
-        "token": token,
-        "token_type": "email_verification",
-        "used": False,
-        "expires_at": {"$gt": datetime.now(timezone.utc)}
-    })
+    token_obj = await consume_email_token(token, "email_verification")
     
     if not token_obj:
         raise HTTPException(status_code=400, detail="Invalid or expired token")
@@ -600,12 +1429,7 @@ async def verify_email(token: str):
         {"id": token_obj["user_id"]},
         {"$set": {"email_verified": True, "updated_at": datetime.now(timezone.utc)}}
     )
-    
-    # Marcar token como usado
-    await db.email_tokens.update_one(
-        {"id": token_obj["id"]},
-        {"$set": {"used": True}}
-    )
+    user_cache.invalidate(token_obj["user_id"])
     
     return {"message": "Email verified successfully"}
 
@@ -653,18 +1477,18 @@ async def request_password_reset(request: PasswordResetRequest):
 @api_router.post("/auth/reset-password")
 async def reset_password(reset_data: PasswordResetConfirm):
     """Confirmar nueva contraseña con token"""
-    token_obj = await db.email_tokens.find_one({
-        "token": reset_data.token,
-        "token_type": "password_reset",
-        "used": False,
-        "expires_at": {"$gt": datetime.now(timezone.utc)}
-    })
+    token_obj = await consume_email_token(reset_data.token, "password_reset")
     
     if not token_obj:
         raise HTTPException(status_code=400, detail="Invalid or expired token")
     
     # Hash nueva contraseña
-    hashed_password = pwd_context.hash(reset_data.new_password)
+    try:
+        hashed_password = await get_password_hash(reset_data.new_password)
+    except HTTPException:
+        # Si el pool de bcrypt está saturado el token vuelve a quedar disponible
+        await db.email_tokens.update_one({"id": token_obj["id"]}, {"$set": {"used": False}})
+        raise
     
     # Actualizar contraseña del usuario
     await db.users.update_one(
@@ -672,12 +1496,6 @@ async def reset_password(reset_data: PasswordResetConfirm):
         {"$set": {"password": hashed_password, "updated_at": datetime.now(timezone.utc)}}
     )
     
-    # Marcar token como usado
-    await db.email_tokens.update_one(
-        {"id": token_obj["id"]},
-        {"$set": {"used": True}}
-    )
-    
     return {"message": "Password reset successfully"}
 
 
@@ -713,90 +1531,93 @@ async def create_patient(patient: PatientCreate, current_user: User = Depends(ge
     patient_obj = Patient(**patient_dict)
     
     # Seleccionar base de datos correcta basada en el contexto
-    if patient_dict["database_context"]:
-        collection_name = f"patients_{patient_dict['database_context']}"
-    else:
-        collection_name = "patients"
+    collection_name = patient_collection_name(patient_dict["database_context"])
     
-    await db[collection_name].insert_one(patient_obj.dict())
+    patients = await tenant_router.collection(collection_name)
+    await patients.insert_one(patient_obj.dict())
+    await db.patient_directory.insert_one(patient_directory_entry(patient_obj.dict(), collection_name))
     return patient_obj
 
 # Patient endpoints con nueva lógica de permisos
 @api_router.get("/patients", response_model=List[Patient])
-async def get_patients(current_user: User = Depends(get_current_user)):
-    query = {}
-    
-    if current_user.role == UserRole.SUPER_ADMIN:
-        # Super admin ve todos los pacientes
-        pass
-    elif current_user.role == UserRole.CENTER_ADMIN:
-        # Admin de centro ve pacientes de su centro y pacientes compartidos
-        query = {
-            "$or": [
-                {"center_id": current_user.center_id},  # Pacientes del centro
-                {"database_context": current_user.center_id}  # Contexto del centro
-            ]
-        }
-    elif current_user.role == UserRole.PSYCHOLOGIST:
-        # Psicólogo ve solo sus pacientes individuales y los compartidos con él
-        query = {
-            "$or": [
-                {"psychologist_id": current_user.id},  # Sus pacientes
-                {"shared_with": {"$in": [current_user.id]}},  # Compartidos con él
-                {"database_context": current_user.id}  # Su contexto privado
-            ]
-        }
-    else:
-        raise HTTPException(status_code=403, detail="Access denied")
+async def get_patients(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Preset (summary, detail) or comma-separated Patient fields"),
+    current_user: User = Depends(get_current_user)
+):
+    # Propios, compartidos y del contexto del usuario (ver policy.PATIENT_LIST)
+    query = permission_filter(current_user, policy.PATIENT_LIST)
     
-    patients = await db.patients.find(query).to_list(1000)
-    return [Patient(**patient) for patient in patients]
+    selected_fields = parse_patient_fields(fields)
+    model = patient_fields_model(selected_fields)
+    entries, next_cursor = await find_page(db.patient_directory, query, limit=limit, cursor=cursor)
+    patients = await fetch_patients(entries, patient_projection(selected_fields))
+    return model_list_response([model(**patient) for patient in patients], next_cursor, request)
 
 @api_router.get("/patients/{patient_id}", response_model=Patient)
-async def get_patient(patient_id: str, current_user: User = Depends(get_current_user)):
-    patient = await db.patients.find_one({"id": patient_id})
+async def get_patient(
+    patient_id: str,
+    request: Request,
+    fields: Optional[str] = Query(None, description="Preset (summary, detail) or comma-separated Patient fields"),
+    current_user: User = Depends(get_current_user)
+):
+    selected_fields = parse_patient_fields(fields)
+    access = await authorize_patient(patient_id, current_user, check_permissions=False)
+    patients = await patient_collection(access)
+    
+    # El permiso va en el filtro
+    patient_filter = {"id": patient_id, **patient_permission_filter(current_user)}
+    if request.headers.get("if-none-match"):
+        current = await patients.find_one(patient_filter, {"_id": 0, "updated_at": 1})
+        if current is None:
+            await raise_not_found_or_denied(patients, patient_id, "Patient not found")
+        etag = document_etag(patient_id, current.get("updated_at"), selected_fields)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+    
+    # updated_at se lee siempre para el ETag, aunque no se haya pedido
+    patient = await patients.find_one(patient_filter, {**patient_projection(selected_fields), "updated_at": 1})
     if not patient:
-        raise HTTPException(status_code=404, detail="Patient not found")
+        await raise_not_found_or_denied(patients, patient_id, "Patient not found")
     
-    # Check permissions
-    if (current_user.role == UserRole.PSYCHOLOGIST and patient["psychologist_id"] != current_user.id) or \
-       (current_user.role == UserRole.CENTER_ADMIN and patient["center_id"] != current_user.center_id):
-        raise HTTPException(status_code=403, detail="Access denied")
-    
-    return Patient(**patient)
+    etag = document_etag(patient_id, patient.get("updated_at"), selected_fields)
+    return model_response(patient_fields_model(selected_fields)(**patient), etag)
 
 @api_router.put("/patients/{patient_id}", response_model=Patient)
 async def update_patient(patient_id: str, update_data: dict, current_user: User = Depends(get_current_user)):
-    patient = await db.patients.find_one({"id": patient_id})
-    if not patient:
-        raise HTTPException(status_code=404, detail="Patient not found")
+    access = await authorize_patient(patient_id, current_user, check_permissions=False)
+    patients = await patient_collection(access)
     
-    # Check permissions
-    if (current_user.role == UserRole.PSYCHOLOGIST and patient["psychologist_id"] != current_user.id) or \
-       (current_user.role == UserRole.CENTER_ADMIN and patient["center_id"] != current_user.center_id):
-        raise HTTPException(status_code=403, detail="Access denied")
+    # El paciente no cambia de colección: id y database_context no se modifican aquí
+    update_data = {k: v for k, v in update_data.items() if k not in ("id", "database_context")}
     
-    # Update patient data
+    # Update patient data (el permiso va en el filtro)
     update_data["updated_at"] = datetime.now(timezone.utc)
-    await db.patients.update_one(
-        {"id": patient_id},
-        {"$set": update_data}
+    updated_patient = await patients.find_one_and_update(
+        {"id": patient_id, **patient_permission_filter(current_user)},
+        {"$set": update_data},
+        return_document=ReturnDocument.AFTER
     )
+    if updated_patient is None:
+        await raise_not_found_or_denied(patients, patient_id, "Patient not found")
+    
+    directory_update = {field: update_data[field] for field in PATIENT_DIRECTORY_FIELDS if field in update_data}
+    if directory_update:
+        await db.patient_directory.update_one({"id": patient_id}, {"$set": directory_update})
+        patient_access_cache.invalidate(patient_id)
+        owner_update = {field: directory_update[field] for field in ("psychologist_id", "center_id") if field in directory_update}
+        if owner_update:
+            await db.session_objectives.update_many({"patient_id": patient_id}, {"$set": owner_update})
     
-    updated_patient = await db.patients.find_one({"id": patient_id})
     return Patient(**updated_patient)
 
 # Anamnesis endpoints
 @api_router.post("/patients/{patient_id}/anamnesis")
 async def create_anamnesis(patient_id: str, anamnesis_data: AnamnesisCreate, current_user: User = Depends(get_current_user)):
-    patient = await db.patients.find_one({"id": patient_id})
-    if not patient:
-        raise HTTPException(status_code=404, detail="Patient not found")
-    
-    # Check permissions
-    if (current_user.role == UserRole.PSYCHOLOGIST and patient["psychologist_id"] != current_user.id) or \
-       (current_user.role == UserRole.CENTER_ADMIN and patient["center_id"] != current_user.center_id):
-        raise HTTPException(status_code=403, detail="Access denied")
+    access = await authorize_patient(patient_id, current_user, check_permissions=False)
+    patients = await patient_collection(access)
     
     anamnesis_dict = anamnesis_data.dict()
     anamnesis_dict["patient_id"] = patient_id
@@ -806,22 +1627,22 @@ async def create_anamnesis(patient_id: str, anamnesis_data: AnamnesisCreate, cur
     anamnesis_dict["created_at"] = datetime.now(timezone.utc)
     anamnesis_dict["updated_at"] = datetime.now(timezone.utc)
     
-    await db.patients.update_one(
-        {"id": patient_id},
+    result = await patients.update_one(
+        {"id": patient_id, **patient_permission_filter(current_user)},
         {"$set": {"anamnesis": anamnesis_dict, "updated_at": datetime.now(timezone.utc)}}
     )
+    if not result.matched_count:
+        await raise_not_found_or_denied(patients, patient_id, "Patient not found")
     return {"message": "Anamnesis created successfully", "anamnesis": anamnesis_dict}
 
 @api_router.put("/patients/{patient_id}/anamnesis")
 async def update_anamnesis(patient_id: str, anamnesis_data: AnamnesisCreate, current_user: User = Depends(get_current_user)):
-    patient = await db.patients.find_one({"id": patient_id})
-    if not patient:
-        raise HTTPException(status_code=404, detail="Patient not found")
-    
-    # Check permissions
-    if (current_user.role == UserRole.PSYCHOLOGIST and patient["psychologist_id"] != current_user.id) or \
-       (current_user.role == UserRole.CENTER_ADMIN and patient["center_id"] != current_user.center_id):
-        raise HTTPException(status_code=403, detail="Access denied")
+    access = await authorize_patient(patient_id, current_user, check_permissions=False)
+    patients = await patient_collection(access)
+    permission = patient_permission_filter(current_user)
+    patient = await patients.find_one({"id": patient_id, **permission}, {"_id": 0, "anamnesis": 1})
+    if patient is None:
+        await raise_not_found_or_denied(patients, patient_id, "Patient not found")
     
     anamnesis_dict = anamnesis_data.dict()
     anamnesis_dict["patient_id"] = patient_id
@@ -839,39 +1660,48 @@ async def update_anamnesis(patient_id: str, anamnesis_data: AnamnesisCreate, cur
         anamnesis_dict["created_by"] = current_user.id
         anamnesis_dict["created_at"] = datetime.now(timezone.utc)
     
-    await db.patients.update_one(
-        {"id": patient_id},
+    await patients.update_one(
+        {"id": patient_id, **permission},
         {"$set": {"anamnesis": anamnesis_dict, "updated_at": datetime.now(timezone.utc)}}
     )
     return {"message": "Anamnesis updated successfully", "anamnesis": anamnesis_dict}
 
 @api_router.get("/patients/{patient_id}/anamnesis")
-async def get_anamnesis(patient_id: str, current_user: User = Depends(get_current_user)):
-    patient = await db.patients.find_one({"id": patient_id})
-    if not patient:
-        raise HTTPException(status_code=404, detail="Patient not found")
-    
-    # Check permissions
-    if (current_user.role == UserRole.PSYCHOLOGIST and patient["psychologist_id"] != current_user.id) or \
-       (current_user.role == UserRole.CENTER_ADMIN and patient["center_id"] != current_user.center_id):
-        raise HTTPException(status_code=403, detail="Access denied")
+async def get_anamnesis(patient_id: str, request: Request, current_user: User = Depends(get_current_user)):
+    access = await authorize_patient(patient_id, current_user, check_permissions=False)
+    patients = await patient_collection(access)
+    patient_filter = {"id": patient_id, **patient_permission_filter(current_user)}
+    if request.headers.get("if-none-match"):
+        current = await patients.find_one(patient_filter, {"_id": 0, "anamnesis.updated_at": 1})
+        if current is None:
+            await raise_not_found_or_denied(patients, patient_id, "Patient not found")
+        etag = document_etag(patient_id, (current.get("anamnesis") or {}).get("updated_at"))
+        if etag_matches(request, etag):
+            return not_modified(etag)
+    
+    patient = await patients.find_one(patient_filter, {"_id": 0, "anamnesis": 1})
+    if patient is None:
+        await raise_not_found_or_denied(patients, patient_id, "Patient not found")
     
     anamnesis = patient.get("anamnesis")
     if not anamnesis:
         raise HTTPException(status_code=404, detail="Anamnesis not found")
     
-    return {"anamnesis": anamnesis}
+    response = FastJSONResponse({"anamnesis": anamnesis})
+    etag = document_etag(patient_id, anamnesis.get("updated_at"))
+    if etag:
+        response.headers["ETag"] = etag
+    return response
 
 @api_router.put("/patients/{patient_id}/clinical-history")
 async def update_clinical_history(patient_id: str, history: ClinicalHistory, current_user: User = Depends(get_current_user)):
-    patient = await db.patients.find_one({"id": patient_id})
-    if not patient:
-        raise HTTPException(status_code=404, detail="Patient not found")
+    access = await authorize_patient(patient_id, current_user, check_permissions=False)
+    patients = await patient_collection(access)
     
     history_dict = history.dict()
     history_dict["created_by"] = current_user.id
     
-    await db.patients.update_one(
+    await patients.update_one(
         {"id": patient_id},
         {"$set": {"clinical_history": history_dict, "updated_at": datetime.now(timezone.utc)}}
     )
@@ -879,30 +1709,40 @@ async def update_clinical_history(patient_id: str, history: ClinicalHistory, cur
 
 @api_router.post("/patients/{patient_id}/evaluations")
 async def add_evaluation(patient_id: str, evaluation: Evaluation, current_user: User = Depends(get_current_user)):
-    patient = await db.patients.find_one({"id": patient_id})
-    if not patient:
-        raise HTTPException(status_code=404, detail="Patient not found")
+    access = await authorize_patient(patient_id, current_user, check_permissions=False)
+    patients = await patient_collection(access)
     
     evaluation_dict = evaluation.dict()
     evaluation_dict["id"] = str(uuid.uuid4())
+    evaluation_dict["patient_id"] = patient_id
     evaluation_dict["created_by"] = current_user.id
     
-    await db.patients.update_one(
-        {"id": patient_id},
-        {"$push": {"evaluations": evaluation_dict}, "$set": {"updated_at": datetime.now(timezone.utc)}}
-    )
+    await db.patient_evaluations.insert_one(evaluation_dict)
+    await patients.update_one({"id": patient_id}, {"$set": {"updated_at": datetime.now(timezone.utc)}})
     return {"message": "Evaluation added successfully"}
 
+@api_router.get("/patients/{patient_id}/evaluations", response_model=List[Evaluation])
+async def get_evaluations(
+    request: Request,
+    patient_id: str,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    await authorize_patient(patient_id, current_user)
+    
+    evaluations, next_cursor = await find_page(db.patient_evaluations, {"patient_id": patient_id}, "created_at", -1, limit, cursor)
+    return model_list_response([Evaluation(**evaluation) for evaluation in evaluations], next_cursor, request)
+
 @api_router.put("/patients/{patient_id}/diagnosis")
 async def update_diagnosis(patient_id: str, diagnosis: Diagnosis, current_user: User = Depends(get_current_user)):
-    patient = await db.patients.find_one({"id": patient_id})
-    if not patient:
-        raise HTTPException(status_code=404, detail="Patient not found")
+    access = await authorize_patient(patient_id, current_user, check_permissions=False)
+    patients = await patient_collection(access)
     
     diagnosis_dict = diagnosis.dict()
     diagnosis_dict["created_by"] = current_user.id
     
-    await db.patients.update_one(
+    await patients.update_one(
         {"id": patient_id},
         {"$set": {"diagnosis": diagnosis_dict, "updated_at": datetime.now(timezone.utc)}}
     )
@@ -910,32 +1750,36 @@ async def update_diagnosis(patient_id: str, diagnosis: Diagnosis, current_user:
 
 @api_router.post("/patients/{patient_id}/progress-notes")
 async def add_progress_note(patient_id: str, note: ProgressNote, current_user: User = Depends(get_current_user)):
-    patient = await db.patients.find_one({"id": patient_id})
-    if not patient:
-        raise HTTPException(status_code=404, detail="Patient not found")
+    access = await authorize_patient(patient_id, current_user, check_permissions=False)
+    patients = await patient_collection(access)
     
     note_dict = note.dict()
     note_dict["id"] = str(uuid.uuid4())
+    note_dict["patient_id"] = patient_id
     note_dict["created_by"] = current_user.id
     
-    await db.patients.update_one(
-        {"id": patient_id},
-        {"$push": {"progress_notes": note_dict}, "$set": {"updated_at": datetime.now(timezone.utc)}}
-    )
+    await db.patient_progress_notes.insert_one(note_dict)
+    await patients.update_one({"id": patient_id}, {"$set": {"updated_at": datetime.now(timezone.utc)}})
     return {"message": "Progress note added successfully"}
 
+@api_router.get("/patients/{patient_id}/progress-notes", response_model=List[ProgressNote])
+async def get_progress_notes(
+    request: Request,
+    patient_id: str,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    await authorize_patient(patient_id, current_user)
+    
+    notes, next_cursor = await find_page(db.patient_progress_notes, {"patient_id": patient_id}, "created_at", -1, limit, cursor)
+    return model_list_response([ProgressNote(**note) for note in notes], next_cursor, request)
+
 # Appointment endpoints
 @api_router.post("/appointments", response_model=Appointment)
 async def create_appointment(appointment: AppointmentCreate, current_user: User = Depends(get_current_user)):
-    # Verify patient exists and user has access
-    patient = await db.patients.find_one({"id": appointment.patient_id})
-    if not patient:
-        raise HTTPException(status_code=404, detail="Patient not found")
-    
-    # Check permissions
-    if (current_user.role == UserRole.PSYCHOLOGIST and patient["psychologist_id"] != current_user.id) or \
-       (current_user.role == UserRole.CENTER_ADMIN and patient["center_id"] != current_user.center_id):
-        raise HTTPException(status_code=403, detail="Access denied")
+    # Verify patient exists and user has access (policy evaluated on the cached directory entry)
+    await authorize_patient(appointment.patient_id, current_user)
     
     appointment_dict = appointment.dict()
     appointment_dict["psychologist_id"] = current_user.id
@@ -947,21 +1791,16 @@ async def create_appointment(appointment: AppointmentCreate, current_user: User
 
 @api_router.get("/appointments", response_model=List[Appointment])
 async def get_appointments(
+    request: Request,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     patient_id: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user)
 ):
-    query = {}
-    
     # Role-based filtering
-    if current_user.role == UserRole.PSYCHOLOGIST:
-        query["psychologist_id"] = current_user.id
-    elif current_user.role == UserRole.CENTER_ADMIN:
-        # Get all psychologists from this center
-        center_psychologists = await db.users.find({"center_id": current_user.center_id, "role": UserRole.PSYCHOLOGIST}).to_list(1000)
-        psychologist_ids = [p["id"] for p in center_psychologists] + [current_user.id]
-        query["psychologist_id"] = {"$in": psychologist_ids}
+    query = await record_list_filter(current_user)
     
     # Date filtering
     if start_date and end_date:
@@ -975,73 +1814,51 @@ async def get_appointments(
     if patient_id:
         query["patient_id"] = patient_id
     
-    appointments = await db.appointments.find(query).sort("appointment_date", 1).to_list(1000)
-    return [Appointment(**appointment) for appointment in appointments]
+    appointments, next_cursor = await find_page(db.appointments, query, "appointment_date", 1, limit, cursor)
+    return model_list_response([Appointment(**appointment) for appointment in appointments], next_cursor, request)
 
 @api_router.get("/appointments/{appointment_id}", response_model=Appointment)
 async def get_appointment(appointment_id: str, current_user: User = Depends(get_current_user)):
-    appointment = await db.appointments.find_one({"id": appointment_id})
+    # Check permissions in the filter (misma política que el listado)
+    appointment = await db.appointments.find_one({"id": appointment_id, **await record_list_filter(current_user)})
     if not appointment:
-        raise HTTPException(status_code=404, detail="Appointment not found")
-    
-    # Check permissions
-    if (current_user.role == UserRole.PSYCHOLOGIST and appointment["psychologist_id"] != current_user.id) or \
-       (current_user.role == UserRole.CENTER_ADMIN):
-        # For center admin, check if psychologist belongs to their center
-        psychologist = await db.users.find_one({"id": appointment["psychologist_id"]})
-        if not psychologist or psychologist["center_id"] != current_user.center_id:
-            raise HTTPException(status_code=403, detail="Access denied")
+        await raise_not_found_or_denied(db.appointments, appointment_id, "Appointment not found")
     
     return Appointment(**appointment)
 
 @api_router.put("/appointments/{appointment_id}", response_model=Appointment)
 async def update_appointment(appointment_id: str, update_data: AppointmentUpdate, current_user: User = Depends(get_current_user)):
-    appointment = await db.appointments.find_one({"id": appointment_id})
-    if not appointment:
-        raise HTTPException(status_code=404, detail="Appointment not found")
-    
-    # Check permissions
-    if current_user.role == UserRole.PSYCHOLOGIST and appointment["psychologist_id"] != current_user.id:
-        raise HTTPException(status_code=403, detail="Access denied")
-    
     update_dict = {k: v for k, v in update_data.dict().items() if v is not None}
     update_dict["updated_at"] = datetime.now(timezone.utc)
     
-    await db.appointments.update_one(
-        {"id": appointment_id},
-        {"$set": update_dict}
+    # Check permissions in the filter
+    updated_appointment = await db.appointments.find_one_and_update(
+        {"id": appointment_id, **permission_filter(current_user, policy.OWNED_RECORD)},
+        {"$set": update_dict},
+        return_document=ReturnDocument.AFTER
     )
+    if updated_appointment is None:
+        await raise_not_found_or_denied(db.appointments, appointment_id, "Appointment not found")
     
-    updated_appointment = await db.appointments.find_one({"id": appointment_id})
     return Appointment(**updated_appointment)
 
 @api_router.delete("/appointments/{appointment_id}")
 async def delete_appointment(appointment_id: str, current_user: User = Depends(get_current_user)):
-    appointment = await db.appointments.find_one({"id": appointment_id})
-    if not appointment:
-        raise HTTPException(status_code=404, detail="Appointment not found")
-    
-    # Check permissions
-    if current_user.role == UserRole.PSYCHOLOGIST and appointment["psychologist_id"] != current_user.id:
-        raise HTTPException(status_code=403, detail="Access denied")
-    
-    await db.appointments.delete_one({"id": appointment_id})
+    # Check permissions in the filter
+    result = await db.appointments.delete_one({"id": appointment_id, **permission_filter(current_user, policy.OWNED_RECORD)})
+    if not result.deleted_count:
+        await raise_not_found_or_denied(db.appointments, appointment_id, "Appointment not found")
     return {"message": "Appointment deleted successfully"}
 
 # Session Objectives endpoints
 @api_router.post("/session-objectives", response_model=SessionObjective)
 async def create_session_objective(objective: SessionObjectiveCreate, current_user: User = Depends(get_current_user)):
     # Verify patient exists and user has access
-    patient = await db.patients.find_one({"id": objective.patient_id})
-    if not patient:
-        raise HTTPException(status_code=404, detail="Patient not found")
-    
-    # Check permissions
-    if (current_user.role == UserRole.PSYCHOLOGIST and patient["psychologist_id"] != current_user.id) or \
-       (current_user.role == UserRole.CENTER_ADMIN and patient["center_id"] != current_user.center_id):
-        raise HTTPException(status_code=403, detail="Access denied")
+    patient = await authorize_patient(objective.patient_id, current_user)
     
     objective_dict = objective.dict()
+    objective_dict["psychologist_id"] = patient["psychologist_id"]
+    objective_dict["center_id"] = patient.get("center_id")
     objective_dict["created_by"] = current_user.id
     
     objective_obj = SessionObjective(**objective_dict)
@@ -1050,36 +1867,24 @@ async def create_session_objective(objective: SessionObjectiveCreate, current_us
 
 @api_router.get("/session-objectives", response_model=List[SessionObjective])
 async def get_session_objectives(
+    request: Request,
     patient_id: Optional[str] = None,
     week_start_date: Optional[str] = None,
     status: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user)
 ):
     query = {}
     
     # Patient filtering with permission check
     if patient_id:
-        patient = await db.patients.find_one({"id": patient_id})
-        if not patient:
-            raise HTTPException(status_code=404, detail="Patient not found")
-        
-        # Check permissions
-        if (current_user.role == UserRole.PSYCHOLOGIST and patient["psychologist_id"] != current_user.id) or \
-           (current_user.role == UserRole.CENTER_ADMIN and patient["center_id"] != current_user.center_id):
-            raise HTTPException(status_code=403, detail="Access denied")
+        await authorize_patient(patient_id, current_user)
         
         query["patient_id"] = patient_id
     else:
-        # Get objectives for all accessible patients
-        if current_user.role == UserRole.PSYCHOLOGIST:
-            accessible_patients = await db.patients.find({"psychologist_id": current_user.id}).to_list(1000)
-        elif current_user.role == UserRole.CENTER_ADMIN:
-            accessible_patients = await db.patients.find({"center_id": current_user.center_id}).to_list(1000)
-        else:  # Super admin
-            accessible_patients = await db.patients.find().to_list(1000)
-        
-        patient_ids = [p["id"] for p in accessible_patients]
-        query["patient_id"] = {"$in": patient_ids}
+        # Objectives of all accessible patients, using the ownership copied onto each objective
+        query.update(patient_permission_filter(current_user))
     
     # Additional filters
     if week_start_date:
@@ -1087,91 +1892,267 @@ async def get_session_objectives(
     if status:
         query["status"] = status
     
-    objectives = await db.session_objectives.find(query).sort("created_at", -1).to_list(1000)
-    return [SessionObjective(**obj) for obj in objectives]
+    objectives, next_cursor = await find_page(db.session_objectives, query, "created_at", -1, limit, cursor)
+    return model_list_response([SessionObjective(**obj) for obj in objectives], next_cursor, request)
 
 @api_router.put("/session-objectives/{objective_id}", response_model=SessionObjective)
 async def update_session_objective(objective_id: str, update_data: SessionObjectiveUpdate, current_user: User = Depends(get_current_user)):
-    objective = await db.session_objectives.find_one({"id": objective_id})
-    if not objective:
-        raise HTTPException(status_code=404, detail="Session objective not found")
-    
-    # Check permissions through patient
-    patient = await db.patients.find_one({"id": objective["patient_id"]})
-    if not patient:
-        raise HTTPException(status_code=404, detail="Patient not found")
-    
-    if (current_user.role == UserRole.PSYCHOLOGIST and patient["psychologist_id"] != current_user.id) or \
-       (current_user.role == UserRole.CENTER_ADMIN and patient["center_id"] != current_user.center_id):
-        raise HTTPException(status_code=403, detail="Access denied")
-    
     update_dict = {k: v for k, v in update_data.dict().items() if v is not None}
     update_dict["updated_at"] = datetime.now(timezone.utc)
     
-    await db.session_objectives.update_one(
-        {"id": objective_id},
-        {"$set": update_dict}
+    # Check permissions in the filter
+    updated_objective = await db.session_objectives.find_one_and_update(
+        {"id": objective_id, **patient_permission_filter(current_user)},
+        {"$set": update_dict},
+        return_document=ReturnDocument.AFTER
     )
+    if updated_objective is None:
+        await authorize_session_objective(objective_id, current_user)
+        updated_objective = await db.session_objectives.find_one_and_update(
+            {"id": objective_id},
+            {"$set": update_dict},
+            return_document=ReturnDocument.AFTER
+        )
     
-    updated_objective = await db.session_objectives.find_one({"id": objective_id})
     return SessionObjective(**updated_objective)
 
 @api_router.delete("/session-objectives/{objective_id}")
 async def delete_session_objective(objective_id: str, current_user: User = Depends(get_current_user)):
-    objective = await db.session_objectives.find_one({"id": objective_id})
+    # Check permissions in the filter
+    result = await db.session_objectives.delete_one({"id": objective_id, **patient_permission_filter(current_user)})
+    if not result.deleted_count:
+        await authorize_session_objective(objective_id, current_user)
+        await db.session_objectives.delete_one({"id": objective_id})
+    return {"message": "Session objective deleted successfully"}
+
+async def authorize_session_objective(objective_id: str, current_user: User):
+    """
+    Verificación a través del paciente, para cuando el filtro con psychologist_id y
+    center_id no encontró el objetivo: no existe, no hay acceso, o es un objetivo
+    anterior a esos campos que aún no pasó por backfill_session_objective_owners.
+    """
+    objective = await db.session_objectives.find_one({"id": objective_id}, {"_id": 0, "patient_id": 1})
     if not objective:
         raise HTTPException(status_code=404, detail="Session objective not found")
+    await authorize_patient(objective["patient_id"], current_user)
+
+async def backfill_session_objective_owners(batch_size: int = 1000, database=None) -> int:
+    """Copia psychologist_id y center_id del paciente a los objetivos que no los tienen"""
+    database = database if database is not None else db
+    projection = {"_id": 0, "id": 1, "psychologist_id": 1, "center_id": 1}
+    patient_collections = await list_patient_collections(database)
+    updated = 0
+    last_id = None
+    while True:
+        # Se avanza por id: los objetivos sin paciente quedan sin dueño y no se vuelven a leer.
+        # "" es la marca que dejaban ejecuciones anteriores para esos huérfanos.
+        query: Dict[str, Any] = {"psychologist_id": {"$in": [None, ""]}}
+        if last_id is not None:
+            query["id"] = {"$gt": last_id}
+        objectives = await database.session_objectives.find(
+            query, {"_id": 0, "id": 1, "patient_id": 1}
+        ).sort("id", 1).limit(batch_size).to_list(batch_size)
+        if not objectives:
+            return updated
+        last_id = objectives[-1]["id"]
+        
+        patient_ids = list({objective["patient_id"] for objective in objectives})
+        owners = {
+            entry["id"]: entry
+            for entry in await database.patient_directory.find(
+                {"id": {"$in": patient_ids}}, projection
+            ).to_list(None)
+        }
+        # Pacientes antiguos o de tenants que aún no están en el directorio
+        for collection_name in patient_collections:
+            missing = [patient_id for patient_id in patient_ids if patient_id not in owners]
+            if not missing:
+                break
+            async for patient in database[collection_name].find({"id": {"$in": missing}}, projection):
+                owners[patient["id"]] = patient
+        
+        operations = []
+        for objective in objectives:
+            owner = owners.get(objective["patient_id"])
+            if owner is None or not owner.get("psychologist_id"):
+                continue
+            operations.append(UpdateOne({"id": objective["id"]}, {"$set": {
+                "psychologist_id": owner["psychologist_id"],
+                "center_id": owner.get("center_id"),
+            }}))
+        if operations:
+            await database.session_objectives.bulk_write(operations, ordered=False)
+            updated += len(operations)
+
+# Migración de evaluaciones y notas de progreso embebidas
+# Antes se guardaban con $push dentro del documento del paciente; ahora viven en
+# patient_evaluations y patient_progress_notes.
+EMBEDDED_CLINICAL_COLLECTIONS = {
+    "evaluations": "patient_evaluations",
+    "progress_notes": "patient_progress_notes",
+}
+
+async def migrate_embedded_clinical_notes(batch_size: int = 100, database=None) -> Dict[str, int]:
+    """
+    Mueve los arreglos embebidos a sus colecciones por lotes de pacientes, recorriendo
+    cada colección de pacientes (la antigua y las de cada tenant).
+    Es idempotente: las entradas sin id reciben uno determinista (uuid5) y se
+    insertan con upsert, así que repetir la migración tras un corte no duplica datos.
+    """
+    database = database if database is not None else db
+    moved = {field: 0 for field in EMBEDDED_CLINICAL_COLLECTIONS}
+    for patients_collection in await list_patient_collections(database):
+        await _migrate_collection_clinical_notes(database, database[patients_collection], batch_size, moved)
+    return moved
+
+async def _migrate_collection_clinical_notes(database, patients_collection, batch_size: int, moved: Dict[str, int]):
+    pending_filter = {"$or": [{f"{field}.0": {"$exists": True}} for field in EMBEDDED_CLINICAL_COLLECTIONS]}
+    projection = {"_id": 0, "id": 1, **{field: 1 for field in EMBEDDED_CLINICAL_COLLECTIONS}}
+    
+    while True:
+        patients = await patients_collection.find(pending_filter, projection).limit(batch_size).to_list(batch_size)
+        if not patients:
+            return
+        
+        for field, collection_name in EMBEDDED_CLINICAL_COLLECTIONS.items():
+            operations = []
+            for patient in patients:
+                for position, entry in enumerate(patient.get(field) or []):
+                    entry = dict(entry)
+                    entry.setdefault("id", str(uuid.uuid5(uuid.NAMESPACE_URL, f"{patient['id']}/{field}/{position}")))
+                    entry["patient_id"] = patient["id"]
+                    entry.setdefault("created_at", datetime.now(timezone.utc))
+                    operations.append(ReplaceOne({"id": entry["id"]}, entry, upsert=True))
+            if operations:
+                await database[collection_name].bulk_write(operations, ordered=False)
+                moved[field] += len(operations)
+        
+        await patients_collection.update_many(
+            {"id": {"$in": [patient["id"] for patient in patients]}},
+            {"$set": {field: [] for field in EMBEDDED_CLINICAL_COLLECTIONS}}
+        )
+
+# Resumen diario de ingresos
+# payment_daily_rollups guarda, por (psychologist_id, center_id, day), la suma y la
+# cantidad de pagos. create/update/delete_payment lo mantienen con $inc y
+# rebuild_payment_rollups lo recalcula completo desde payments.
+ROLLUP_PAYMENT_FIELDS = ("psychologist_id", "center_id", "payment_date", "amount")
+
+def payment_rollup_filter(payment: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "psychologist_id": payment["psychologist_id"],
+        "center_id": payment.get("center_id"),
+        "day": payment["payment_date"],
+    }
+
+async def apply_rollup_deltas(deltas: List[Tuple[Dict[str, Any], float, int]], database=None):
+    """Aplica (filtro, total, count) a payment_daily_rollups en un solo bulk_write"""
+    database = database if database is not None else db
+    now = datetime.now(timezone.utc)
     
-    # Check permissions through patient
-    patient = await db.patients.find_one({"id": objective["patient_id"]})
-    if not patient:
-        raise HTTPException(status_code=404, detail="Patient not found")
-    
-    if (current_user.role == UserRole.PSYCHOLOGIST and patient["psychologist_id"] != current_user.id) or \
-       (current_user.role == UserRole.CENTER_ADMIN and patient["center_id"] != current_user.center_id):
-        raise HTTPException(status_code=403, detail="Access denied")
+    def operation(rollup_filter: Dict[str, Any], total: float, count: int, upsert: bool) -> UpdateOne:
+        update = {"$inc": {"total": total, "count": count}, "$set": {"updated_at": now}}
+        return UpdateOne(rollup_filter, update, upsert=upsert)
     
-    await db.session_objectives.delete_one({"id": objective_id})
-    return {"message": "Session objective deleted successfully"}
+    try:
+        await database.payment_daily_rollups.bulk_write([operation(*delta, True) for delta in deltas], ordered=False)
+    except BulkWriteError as e:
+        # Upserts concurrentes sobre la misma fila: los que chocaron ya la encuentran
+        errors = e.details.get("writeErrors", [])
+        if not errors or any(error.get("code") != 11000 for error in errors):
+            raise
+        retry = [operation(*deltas[error["index"]], False) for error in errors]
+        await database.payment_daily_rollups.bulk_write(retry, ordered=False)
+
+async def apply_payment_to_rollup(payment: Dict[str, Any], sign: int, database=None):
+    """Suma (sign=1) o resta (sign=-1) un pago de su fila diaria"""
+    await apply_rollup_deltas([(payment_rollup_filter(payment), sign * payment["amount"], sign)], database)
+
+async def move_payment_in_rollup(before: Dict[str, Any], after: Dict[str, Any], database=None):
+    """Resta la versión anterior de un pago y suma la nueva en una sola escritura"""
+    before_filter, after_filter = payment_rollup_filter(before), payment_rollup_filter(after)
+    if before_filter == after_filter:
+        deltas = [(after_filter, after["amount"] - before["amount"], 0)]
+    else:
+        deltas = [(before_filter, -before["amount"], -1), (after_filter, after["amount"], 1)]
+    await apply_rollup_deltas(deltas, database)
+
+async def rebuild_payment_rollups(database=None):
+    """
+    Recalcula payment_daily_rollups desde cero con una sola agregación.
+    Antes se copia en los pagos anteriores a center_id el centro del paciente desde
+    patient_directory, para que apply_payment_to_rollup los encuentre en la misma
+    fila al editarlos o borrarlos. $out reemplaza la colección de forma atómica
+    conservando sus índices; los pagos que se escriban mientras corre pueden quedar
+    fuera, así que conviene ejecutarlo en baja carga.
+    """
+    database = database if database is not None else db
+    backfill_pipeline = [
+        {"$match": {"center_id": None}},
+        {"$lookup": {
+            "from": "patient_directory",
+            "localField": "patient_id",
+            "foreignField": "id",
+            "as": "patient",
+        }},
+        {"$project": {"_id": 0, "id": 1, "center_id": {"$arrayElemAt": ["$patient.center_id", 0]}}},
+        {"$match": {"center_id": {"$ne": None}}},
+        {"$merge": {"into": "payments", "on": "id", "whenMatched": "merge", "whenNotMatched": "discard"}},
+    ]
+    await database.payments.aggregate(backfill_pipeline, allowDiskUse=True).to_list(None)
+    
+    pipeline = [
+        {"$group": {
+            "_id": {
+                "psychologist_id": "$psychologist_id",
+                "center_id": "$center_id",
+                "day": "$payment_date",
+            },
+            "total": {"$sum": "$amount"},
+            "count": {"$sum": 1},
+        }},
+        {"$project": {
+            "_id": 0,
+            "psychologist_id": "$_id.psychologist_id",
+            "center_id": {"$ifNull": ["$_id.center_id", None]},
+            "day": "$_id.day",
+            "total": 1,
+            "count": 1,
+            "updated_at": "$$NOW",
+        }},
+        {"$out": "payment_daily_rollups"},
+    ]
+    await database.payments.aggregate(pipeline, allowDiskUse=True).to_list(None)
+    return await database.payment_daily_rollups.count_documents({})
 
 # Payment endpoints
 @api_router.post("/payments", response_model=Payment)
 async def create_payment(payment: PaymentCreate, current_user: User = Depends(get_current_user)):
     # Verify patient exists and user has access
-    patient = await db.patients.find_one({"id": payment.patient_id})
-    if not patient:
-        raise HTTPException(status_code=404, detail="Patient not found")
-    
-    # Check permissions
-    if (current_user.role == UserRole.PSYCHOLOGIST and patient["psychologist_id"] != current_user.id) or \
-       (current_user.role == UserRole.CENTER_ADMIN and patient["center_id"] != current_user.center_id):
-        raise HTTPException(status_code=403, detail="Access denied")
+    patient = await authorize_patient(payment.patient_id, current_user)
     
     payment_dict = payment.dict()
     payment_dict["psychologist_id"] = current_user.id
+    payment_dict["center_id"] = patient.get("center_id")
     payment_dict["created_by"] = current_user.id
     
     payment_obj = Payment(**payment_dict)
     await db.payments.insert_one(payment_obj.dict())
+    await apply_payment_to_rollup(payment_obj.dict(), 1)
     return payment_obj
 
 @api_router.get("/payments", response_model=List[Payment])
 async def get_payments(
+    request: Request,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     patient_id: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user)
 ):
-    query = {}
-    
     # Role-based filtering
-    if current_user.role == UserRole.PSYCHOLOGIST:
-        query["psychologist_id"] = current_user.id
-    elif current_user.role == UserRole.CENTER_ADMIN:
-        # Get all psychologists from this center
-        center_psychologists = await db.users.find({"center_id": current_user.center_id, "role": UserRole.PSYCHOLOGIST}).to_list(1000)
-        psychologist_ids = [p["id"] for p in center_psychologists] + [current_user.id]
-        query["psychologist_id"] = {"$in": psychologist_ids}
+    query = await record_list_filter(current_user)
     
     # Date filtering
     if start_date and end_date:
@@ -1185,8 +2166,8 @@ async def get_payments(
     if patient_id:
         query["patient_id"] = patient_id
     
-    payments = await db.payments.find(query).sort("payment_date", -1).to_list(1000)
-    return [Payment(**payment) for payment in payments]
+    payments, next_cursor = await find_page(db.payments, query, "payment_date", -1, limit, cursor)
+    return model_list_response([Payment(**payment) for payment in payments], next_cursor, request)
 
 @api_router.get("/payments/stats")
 async def get_payment_stats(
@@ -1194,73 +2175,91 @@ async def get_payment_stats(
     end_date: Optional[str] = None,
     current_user: User = Depends(get_current_user)
 ):
-    from datetime import datetime, timedelta
-    import calendar
-    
-    query = {}
-    
     # Role-based filtering
-    if current_user.role == UserRole.PSYCHOLOGIST:
-        query["psychologist_id"] = current_user.id
-    elif current_user.role == UserRole.CENTER_ADMIN:
-        center_psychologists = await db.users.find({"center_id": current_user.center_id, "role": UserRole.PSYCHOLOGIST}).to_list(1000)
-        psychologist_ids = [p["id"] for p in center_psychologists] + [current_user.id]
-        query["psychologist_id"] = {"$in": psychologist_ids}
-    
-    # Get all payments
-    all_payments = await db.payments.find(query).to_list(10000)
-    
-    # Calculate stats
-    today = datetime.now().strftime("%Y-%m-%d")
-    week_start = (datetime.now() - timedelta(days=datetime.now().weekday())).strftime("%Y-%m-%d")
-    month_start = datetime.now().replace(day=1).strftime("%Y-%m-%d")
-    
-    daily_total = sum(p["amount"] for p in all_payments if p["payment_date"] == today)
-    weekly_total = sum(p["amount"] for p in all_payments if p["payment_date"] >= week_start)
-    monthly_total = sum(p["amount"] for p in all_payments if p["payment_date"] >= month_start)
+    return await compute_payment_stats(await record_list_filter(current_user))
+
+async def compute_payment_stats(query: Dict[str, Any], now: Optional[datetime] = None, database=None) -> Dict[str, Any]:
+    """
+    Totales diario, semanal y mensual leídos de payment_daily_rollups.
+    Se recorre una fila por psicólogo, centro y día en lugar de los pagos individuales.
+    """
+    database = database if database is not None else db
+    now = now or datetime.now()
+    today = now.strftime("%Y-%m-%d")
+    week_start = (now - timedelta(days=now.weekday())).strftime("%Y-%m-%d")
+    month_start = now.replace(day=1).strftime("%Y-%m-%d")
+    
+    def sum_where(field: str, condition: Dict[str, Any]) -> Dict[str, Any]:
+        return {"$sum": {"$cond": [condition, f"${field}", 0]}}
+    
+    pipeline = [
+        {"$match": query},
+        {"$group": {
+            "_id": None,
+            "total_payments": {"$sum": "$count"},
+            "daily_total": sum_where("total", {"$eq": ["$day", today]}),
+            "weekly_total": sum_where("total", {"$gte": ["$day", week_start]}),
+            "monthly_total": sum_where("total", {"$gte": ["$day", month_start]}),
+            "monthly_count": sum_where("count", {"$gte": ["$day", month_start]}),
+        }},
+    ]
+    rows = await database.payment_daily_rollups.aggregate(pipeline).to_list(1)
+    totals = rows[0] if rows else {"total_payments": 0, "daily_total": 0, "weekly_total": 0, "monthly_total": 0, "monthly_count": 0}
     
     return {
-        "daily_total": daily_total,
-        "weekly_total": weekly_total,
-        "monthly_total": monthly_total,
-        "total_payments": len(all_payments),
-        "average_per_session": monthly_total / len([p for p in all_payments if p["payment_date"] >= month_start]) if len([p for p in all_payments if p["payment_date"] >= month_start]) > 0 else 0
+        "daily_total": totals["daily_total"],
+        "weekly_total": totals["weekly_total"],
+        "monthly_total": totals["monthly_total"],
+        "total_payments": totals["total_payments"],
+        "average_per_session": totals["monthly_total"] / totals["monthly_count"] if totals["monthly_count"] > 0 else 0
     }
 
 @api_router.put("/payments/{payment_id}", response_model=Payment)
-async def update_payment(payment_id: str, update_data: dict, current_user: User = Depends(get_current_user)):
-    payment = await db.payments.find_one({"id": payment_id})
-    if not payment:
-        raise HTTPException(status_code=404, detail="Payment not found")
-    
-    # Check permissions
-    if current_user.role == UserRole.PSYCHOLOGIST and payment["psychologist_id"] != current_user.id:
-        raise HTTPException(status_code=403, detail="Access denied")
-    
-    await db.payments.update_one(
-        {"id": payment_id},
-        {"$set": update_data}
+async def update_payment(payment_id: str, update_data: PaymentUpdate, current_user: User = Depends(get_current_user)):
+    update_dict = {k: v for k, v in update_data.dict().items() if v is not None}
+    payment_filter = {"id": payment_id, **permission_filter(current_user, policy.OWNED_RECORD)}
+    if not update_dict:
+        payment = await db.payments.find_one(payment_filter)
+        if payment is None:
+            await raise_not_found_or_denied(db.payments, payment_id, "Payment not found")
+        return Payment(**payment)
+    
+    # Check permissions in the filter
+    # Se pide el documento anterior para ajustar el resumen diario
+    payment = await db.payments.find_one_and_update(
+        payment_filter,
+        {"$set": update_dict},
+        return_document=ReturnDocument.BEFORE
     )
+    if payment is None:
+        await raise_not_found_or_denied(db.payments, payment_id, "Payment not found")
     
-    updated_payment = await db.payments.find_one({"id": payment_id})
+    updated_payment = {**payment, **update_dict}
+    if any(payment.get(field) != updated_payment.get(field) for field in ROLLUP_PAYMENT_FIELDS):
+        if isinstance(payment.get("amount"), (int, float)):
+            await move_payment_in_rollup(payment, updated_payment)
+        else:
+            # Importe guardado como texto por versiones anteriores: no se puede restar
+            logger.warning("Payment %s has a non-numeric amount; run manage.py rebuild-payment-rollups", payment_id)
     return Payment(**updated_payment)
 
 @api_router.delete("/payments/{payment_id}")
 async def delete_payment(payment_id: str, current_user: User = Depends(get_current_user)):
-    payment = await db.payments.find_one({"id": payment_id})
-    if not payment:
-        raise HTTPException(status_code=404, detail="Payment not found")
-    
-    # Check permissions
-    if current_user.role == UserRole.PSYCHOLOGIST and payment["psychologist_id"] != current_user.id:
-        raise HTTPException(status_code=403, detail="Access denied")
-    
-    await db.payments.delete_one({"id": payment_id})
+    # Check permissions in the filter
+    payment = await db.payments.find_one_and_delete({"id": payment_id, **permission_filter(current_user, policy.OWNED_RECORD)})
+    if payment is None:
+        await raise_not_found_or_denied(db.payments, payment_id, "Payment not found")
+    await apply_payment_to_rollup(payment, -1)
     return {"message": "Payment deleted successfully"}
 
 # User Management endpoints con nueva lógica de permisos
 @api_router.get("/users", response_model=List[User])
-async def get_users(current_user: User = Depends(get_current_user)):
+async def get_users(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
     query = {}
     
     if current_user.role == UserRole.SUPER_ADMIN:
@@ -1278,8 +2277,8 @@ async def get_users(current_user: User = Depends(get_current_user)):
         # Psicólogos no pueden ver otros usuarios
         raise HTTPException(status_code=403, detail="Access denied")
     
-    users = await db.users.find(query).to_list(1000)
-    return [User(**user) for user in users]
+    users, next_cursor = await find_page(db.users, query, limit=limit, cursor=cursor, projection={"password": 0})
+    return model_list_response([User(**user) for user in users], next_cursor, request)
 
 class UserCreate(BaseModel):
     username: str
@@ -1318,7 +2317,7 @@ async def create_user(user_data: UserCreate, current_user: User = Depends(get_cu
         raise HTTPException(status_code=400, detail="Username or email already exists")
     
     # Hash password
-    hashed_password = pwd_context.hash(user_data.password)
+    hashed_password = await get_password_hash(user_data.password)
     
     user_dict = user_data.dict()
     user_dict["password"] = hashed_password
@@ -1337,6 +2336,7 @@ async def create_user(user_data: UserCreate, current_user: User = Depends(get_cu
     del response_dict["password"]
     
     await db.users.insert_one(user_dict)
+    invalidate_center_membership(user_dict.get("center_id"))
     return User(**response_dict)
 
 class UserUpdate(BaseModel):
@@ -1351,19 +2351,16 @@ class UserUpdate(BaseModel):
 @api_router.put("/users/{user_id}", response_model=User)
 async def update_user(user_id: str, update_data: UserUpdate, current_user: User = Depends(get_current_user)):
     # Only super_admin and center_admin can update users, or users can update themselves (limited)
-    target_user = await db.users.find_one({"id": user_id})
-    if not target_user:
-        raise HTTPException(status_code=404, detail="User not found")
+    user_filter = {"id": user_id}
     
     # Permission checks
     if current_user.role == UserRole.PSYCHOLOGIST and current_user.id != user_id:
-        raise HTTPException(status_code=403, detail="Access denied")
+        await raise_not_found_or_denied(db.users, user_id, "User not found")
     elif current_user.role == UserRole.CENTER_ADMIN:
-        if target_user["center_id"] != current_user.center_id:
-            raise HTTPException(status_code=403, detail="Access denied")
         # Center admin cannot change roles to super_admin
         if update_data.role == UserRole.SUPER_ADMIN:
             raise HTTPException(status_code=403, detail="Cannot assign super admin role")
+        user_filter["center_id"] = current_user.center_id
     
     # Psychologists can only update limited fields
     if current_user.role == UserRole.PSYCHOLOGIST:
@@ -1374,8 +2371,16 @@ async def update_user(user_id: str, update_data: UserUpdate, current_user: User
     
     update_dict["updated_at"] = datetime.now(timezone.utc)
     
-    await db.users.update_one({"id": user_id}, {"$set": update_dict})
-    updated_user = await db.users.find_one({"id": user_id})
+    updated_user = await db.users.find_one_and_update(
+        user_filter,
+        {"$set": update_dict},
+        projection={"_id": 0, "password": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if updated_user is None:
+        await raise_not_found_or_denied(db.users, user_id, "User not found")
+    user_cache.invalidate(user_id)
+    invalidate_center_membership(updated_user.get("center_id"))
     
     return User(**updated_user)
 
@@ -1399,6 +2404,8 @@ async def delete_user(user_id: str, current_user: User = Depends(get_current_use
         raise HTTPException(status_code=400, detail="Cannot delete yourself")
     
     await db.users.update_one({"id": user_id}, {"$set": {"is_active": False, "updated_at": datetime.now(timezone.utc)}})
+    user_cache.invalidate(user_id)
+    invalidate_center_membership(target_user.get("center_id"))
     return {"message": "User deactivated successfully"}
 
 # Center Management endpoints (Solo Super Admin)
@@ -1420,21 +2427,22 @@ async def create_center(center: CenterCreate, current_user: User = Depends(get_c
     return center_obj
 
 @api_router.get("/centers", response_model=List[Center])
-async def get_centers(current_user: User = Depends(get_current_user)):
+async def get_centers(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
     # Solo super_admin puede ver todos los centros
     if current_user.role != UserRole.SUPER_ADMIN:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    centers = await db.centers.find().to_list(1000)
-    return [Center(**center) for center in centers]
+    centers, next_cursor = await find_page(db.centers, {}, limit=limit, cursor=cursor)
+    return model_list_response([Center(**center) for center in centers], next_cursor, request)
 
 @api_router.get("/centers/{center_id}", response_model=Center)
-async def get_center(center_id: str, current_user: User = Depends(get_current_user)):
-    center = await db.centers.find_one({"id": center_id})
-    if not center:
-        raise HTTPException(status_code=404, detail="Center not found")
-    
-    # Verificar permisos
+async def get_center(center_id: str, request: Request, current_user: User = Depends(get_current_user)):
+    # Verificar permisos (solo dependen del usuario, antes de leer el centro)
     if current_user.role == UserRole.SUPER_ADMIN:
         pass  # Acceso completo
     elif current_user.role == UserRole.CENTER_ADMIN and current_user.center_id == center_id:
@@ -1442,7 +2450,19 @@ async def get_center(center_id: str, current_user: User = Depends(get_current_us
     else:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    return Center(**center)
+    if request.headers.get("if-none-match"):
+        current = await db.centers.find_one({"id": center_id}, {"_id": 0, "updated_at": 1})
+        if not current:
+            raise HTTPException(status_code=404, detail="Center not found")
+        etag = document_etag(center_id, current.get("updated_at"))
+        if etag_matches(request, etag):
+            return not_modified(etag)
+    
+    center = await db.centers.find_one({"id": center_id}, {"_id": 0})
+    if not center:
+        raise HTTPException(status_code=404, detail="Center not found")
+    
+    return model_response(Center(**center), document_etag(center_id, center.get("updated_at")))
 
 @api_router.put("/centers/{center_id}", response_model=Center)
 async def update_center(center_id: str, update_data: CenterUpdate, current_user: User = Depends(get_current_user)):
@@ -1450,15 +2470,16 @@ async def update_center(center_id: str, update_data: CenterUpdate, current_user:
     if current_user.role != UserRole.SUPER_ADMIN:
         raise HTTPException(status_code=403, detail="Only super admin can update centers")
     
-    center = await db.centers.find_one({"id": center_id})
-    if not center:
-        raise HTTPException(status_code=404, detail="Center not found")
-    
     update_dict = {k: v for k, v in update_data.dict().items() if v is not None}
     update_dict["updated_at"] = datetime.now(timezone.utc)
     
-    await db.centers.update_one({"id": center_id}, {"$set": update_dict})
-    updated_center = await db.centers.find_one({"id": center_id})
+    updated_center = await db.centers.find_one_and_update(
+        {"id": center_id},
+        {"$set": update_dict},
+        return_document=ReturnDocument.AFTER
+    )
+    if updated_center is None:
+        raise HTTPException(status_code=404, detail="Center not found")
     return Center(**updated_center)
 
 @api_router.delete("/centers/{center_id}")
@@ -1497,6 +2518,8 @@ async def assign_psychologist_to_center(center_id: str, psychologist_id: str, cu
         {"id": psychologist_id},
         {"$set": {"center_id": center_id, "updated_at": datetime.now(timezone.utc)}}
     )
+    user_cache.invalidate(psychologist_id)
+    invalidate_center_membership(psychologist.get("center_id"), center_id)
     
     # Agregar psicólogo a la lista del centro
     await db.centers.update_one(
@@ -1506,6 +2529,46 @@ async def assign_psychologist_to_center(center_id: str, psychologist_id: str, cu
     
     return {"message": "Psychologist assigned to center successfully"}
 
+# Estadísticas internas (Solo Super Admin)
+@api_router.get("/admin/cache-stats")
+async def get_cache_stats(current_user: User = Depends(require_role([UserRole.SUPER_ADMIN]))):
+    return {
+        "user_cache": user_cache.stats(),
+        "patient_access_cache": patient_access_cache.stats(),
+        "center_membership_cache": center_membership_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+    }
+
+@api_router.get("/admin/slow-queries")
+async def get_slow_queries(
+    limit: int = Query(50, ge=1, le=500),
+    since: Optional[datetime] = None,
+    current_user: User = Depends(require_role([UserRole.SUPER_ADMIN]))
+):
+    """Consultas por encima de SLOW_QUERY_THRESHOLD_MS, agrupadas por forma y ordenadas por tiempo total"""
+    return {
+        "threshold_ms": SLOW_QUERY_THRESHOLD_MS,
+        "queries": await slow_queries.summarize(db, limit, since),
+    }
+
+@api_router.get("/admin/profile", response_class=PlainTextResponse)
+async def get_profile(
+    seconds: float = Query(10, gt=0, le=PROFILER_MAX_SECONDS),
+    interval_ms: float = Query(10, ge=1, le=1000),
+    current_user: User = Depends(require_role([UserRole.SUPER_ADMIN]))
+):
+    """
+    Perfila este worker durante `seconds` y devuelve las pilas en formato collapsed
+    (flamegraph.pl, speedscope). Con varios workers de uvicorn solo se perfila el
+    que atiende la petición.
+    """
+    try:
+        stacks = await sampling_profiler.profile(seconds, interval_ms / 1000)
+    except profiler.ProfilerBusy:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    filename = f"profile-{os.getpid()}-{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}.folded"
+    return PlainTextResponse(stacks, headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
 # Initialize Super Admin (for first setup)
 @api_router.post("/init/super-admin")
 async def create_initial_super_admin():
@@ -1515,7 +2578,7 @@ async def create_initial_super_admin():
     
     admin_data = {
         "email": "admin@psychologyportal.com",
-        "password": get_password_hash("admin123"),
+        "password": await get_password_hash("admin123"),
         "full_name": "System Administrator",
         "role": UserRole.SUPER_ADMIN,
         "is_active": True
@@ -1526,6 +2589,11 @@ async def create_initial_super_admin():
     
     return {"message": "Super Admin created successfully", "email": "admin@psychologyportal.com", "password": "admin123"}
 
+# Métricas de Prometheus (fuera de /api, para el scraper)
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return metrics.metrics_response()
+
 # Include the router in the main app
 app.include_router(api_router)
 
@@ -1535,8 +2603,15 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
+app.add_middleware(compression.CompressionMiddleware, minimum_size=COMPRESSION_MINIMUM_SIZE, level=COMPRESSION_LEVEL)
+
+# Se añade al final para quedar como middleware más externo: mide también CORS y
+# el tamaño de respuesta ya comprimido
+app.add_middleware(metrics.PrometheusMiddleware)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -1544,6 +2619,33 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def startup_ensure_indexes():
+    if os.environ.get("ENSURE_INDEXES_ON_STARTUP", "true").lower() != "true":
+        return
+    try:
+        log_index_report(await ensure_indexes())
+    except Exception:
+        logger.exception("Could not reconcile MongoDB indexes on startup")
+
+@app.on_event("startup")
+async def startup_email_outbox_worker():
+    if EMAIL_OUTBOX_WORKER_ENABLED:
+        email_outbox_worker.start()
+
+@app.on_event("startup")
+async def startup_slow_query_recorder():
+    if SLOW_QUERY_ENABLED:
+        slow_query_recorder.start(db)
+
+@app.on_event("startup")
+async def startup_loop_lag_monitor():
+    loop_lag_monitor.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    await loop_lag_monitor.stop()
+    await email_outbox_worker.stop()
+    await slow_query_recorder.stop()
+    client.close()
+    password_hasher.shutdown()
\ No newline at end of file
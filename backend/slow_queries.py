@@ -0,0 +1,250 @@
+"""
+Registro de consultas lentas.
+
+SlowQueryListener es un CommandListener de pymongo: guarda una referencia a cada
+comando de lectura/escritura al empezar y, si al terminar supera el umbral, deja
+un registro en una cola en memoria. Los callbacks corren en los hilos de Motor,
+así que no hacen I/O: SlowQueryRecorder es una tarea asyncio que vacía la cola,
+lanza explain sobre una muestra para saber si el plan usó un índice y escribe
+los registros en una colección capped.
+
+Los filtros se guardan solo como forma (claves y operadores, con los valores
+reemplazados por "?"), porque contienen datos de pacientes.
+"""
+import asyncio
+import json
+import logging
+import random
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional, Set
+
+from pymongo import monitoring
+from pymongo.errors import CollectionInvalid
+
+from metrics import BACKGROUND_ROUTE, current_route
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERIES_COLLECTION = "slow_queries"
+
+# Comandos que llevan filtro (ver command_filter)
+MONITORED_COMMANDS = {"find", "aggregate", "count", "distinct", "findAndModify", "update", "delete"}
+
+# Campos del comando que no se reenvían a explain (sesión, clúster, transacción)
+SESSION_FIELDS = {"lsid", "txnNumber", "autocommit", "startTransaction", "readConcern", "writeConcern"}
+
+REDACTED = "?"
+
+
+def redact(value: Any) -> Any:
+    """Conserva claves y operadores de un filtro y reemplaza los valores"""
+    if isinstance(value, dict):
+        return {key: redact(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        # Los operadores lógicos contienen filtros; las listas de valores se colapsan
+        shapes = []
+        for item in value:
+            shape = redact(item)
+            if shape not in shapes:
+                shapes.append(shape)
+        return shapes
+    return REDACTED
+
+
+def command_filter(command_name: str, command: Dict[str, Any]) -> Any:
+    if command_name == "find":
+        return command.get("filter", {})
+    if command_name in ("count", "distinct", "findAndModify"):
+        return command.get("query", {})
+    if command_name == "aggregate":
+        pipeline = command.get("pipeline", [])
+        match = next((stage["$match"] for stage in pipeline if "$match" in stage), {})
+        # Además del $match se guardan los nombres de las etapas, sin su contenido
+        return {"$match": match, "stages": [next(iter(stage)) for stage in pipeline]}
+    if command_name == "update":
+        return next(iter(command.get("updates", [])), {}).get("q", {})
+    if command_name == "delete":
+        return next(iter(command.get("deletes", [])), {}).get("q", {})
+    return {}
+
+
+def plan_stages(explain: Any, stages: Optional[Set[str]] = None) -> Set[str]:
+    """Todas las etapas ("COLLSCAN", "IXSCAN", ...) que aparecen en la salida de explain"""
+    stages = stages if stages is not None else set()
+    if isinstance(explain, dict):
+        if isinstance(explain.get("stage"), str):
+            stages.add(explain["stage"])
+        for item in explain.values():
+            plan_stages(item, stages)
+    elif isinstance(explain, list):
+        for item in explain:
+            plan_stages(item, stages)
+    return stages
+
+
+class SlowQueryListener(monitoring.CommandListener):
+    def __init__(self, threshold_ms: float, max_pending: int = 1000):
+        self.threshold_ms = threshold_ms
+        self.pending: Deque[Dict[str, Any]] = deque(maxlen=max_pending)
+        self._started: Dict[Any, tuple] = {}
+
+    def started(self, event):
+        if event.command_name not in MONITORED_COMMANDS:
+            return
+        # Las escrituras del propio registro no se registran
+        if event.command.get(event.command_name) == SLOW_QUERIES_COLLECTION:
+            return
+        self._started[(event.connection_id, event.request_id)] = (event.command, current_route.get())
+
+    def succeeded(self, event):
+        self._finish(event, "succeeded")
+
+    def failed(self, event):
+        self._finish(event, "failed")
+
+    def _finish(self, event, status: str):
+        started = self._started.pop((event.connection_id, event.request_id), None)
+        if started is None:
+            return
+        duration_ms = event.duration_micros / 1000
+        if duration_ms < self.threshold_ms:
+            return
+        command, route = started
+        self.pending.append({
+            "command_name": event.command_name,
+            "database": event.database_name,
+            "command": command,
+            "route": route or BACKGROUND_ROUTE,
+            "duration_ms": duration_ms,
+            "status": status,
+            "recorded_at": datetime.now(timezone.utc),
+        })
+
+
+class SlowQueryRecorder:
+    """
+    Tarea asyncio que vacía la cola del listener cada `flush_interval` segundos.
+    A una fracción `explain_sample_rate` de los registros se le pide el plan con
+    explain (verbosity queryPlanner, no ejecuta la consulta).
+    """
+    def __init__(self, listener: SlowQueryListener, flush_interval: float, explain_sample_rate: float,
+                 capped_size_bytes: int):
+        self.listener = listener
+        self.flush_interval = flush_interval
+        self.explain_sample_rate = explain_sample_rate
+        self.capped_size_bytes = capped_size_bytes
+        self._task: Optional[asyncio.Task] = None
+        self._database = None
+
+    def start(self, database):
+        if self._task is None:
+            self._database = database
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def ensure_collection(self):
+        try:
+            await self._database.create_collection(
+                SLOW_QUERIES_COLLECTION, capped=True, size=self.capped_size_bytes
+            )
+        except CollectionInvalid:
+            pass  # Ya existe
+
+    async def _explain(self, record: Dict[str, Any]) -> Optional[Set[str]]:
+        command = {
+            key: value for key, value in record["command"].items()
+            if not key.startswith("$") and key not in SESSION_FIELDS
+        }
+        try:
+            explain = await self._database.client[record["database"]].command(
+                {"explain": command, "verbosity": "queryPlanner"}
+            )
+        except Exception as exc:
+            logger.debug("Could not explain slow %s: %s", record["command_name"], exc)
+            return None
+        return plan_stages(explain)
+
+    async def flush(self) -> int:
+        records = []
+        while self.listener.pending:
+            records.append(self.listener.pending.popleft())
+        if not records:
+            return 0
+
+        documents = []
+        for record in records:
+            command = record["command"]
+            stages = None
+            if record["status"] == "succeeded" and random.random() < self.explain_sample_rate:
+                stages = await self._explain(record)
+            documents.append({
+                "recorded_at": record["recorded_at"],
+                "route": record["route"],
+                "command": record["command_name"],
+                "collection": command.get(record["command_name"]),
+                "filter_shape": json.dumps(redact(command_filter(record["command_name"], command)), sort_keys=True),
+                "sort": json.dumps(command.get("sort")) if command.get("sort") else None,
+                "duration_ms": record["duration_ms"],
+                "status": record["status"],
+                "plan_stages": sorted(stages) if stages is not None else None,
+                "collscan": "COLLSCAN" in stages if stages is not None else None,
+            })
+        await self._database[SLOW_QUERIES_COLLECTION].insert_many(documents, ordered=False)
+        return len(documents)
+
+    async def _run(self):
+        try:
+            await self.ensure_collection()
+        except Exception:
+            logger.exception("Could not create the %s collection", SLOW_QUERIES_COLLECTION)
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Slow query flush failed")
+
+
+async def summarize(database, limit: int = 50, since: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """Consultas lentas agrupadas por ruta, colección, comando y forma del filtro"""
+    match = {"recorded_at": {"$gte": since}} if since else {}
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": {"route": "$route", "collection": "$collection", "command": "$command",
+                    "filter_shape": "$filter_shape", "sort": "$sort"},
+            "count": {"$sum": 1},
+            "total_ms": {"$sum": "$duration_ms"},
+            "max_ms": {"$max": "$duration_ms"},
+            "explained": {"$sum": {"$cond": [{"$eq": [{"$type": "$collscan"}, "bool"]}, 1, 0]}},
+            "collscans": {"$sum": {"$cond": ["$collscan", 1, 0]}},
+            "last_seen": {"$max": "$recorded_at"},
+        }},
+        {"$sort": {"total_ms": -1}},
+        {"$limit": limit},
+    ]
+    rows = await database[SLOW_QUERIES_COLLECTION].aggregate(pipeline).to_list(limit)
+    return [
+        {
+            **row["_id"],
+            "count": row["count"],
+            "avg_ms": row["total_ms"] / row["count"],
+            "max_ms": row["max_ms"],
+            "total_ms": row["total_ms"],
+            "explained": row["explained"],
+            "collscans": row["collscans"],
+            "last_seen": row["last_seen"],
+        }
+        for row in rows
+    ]
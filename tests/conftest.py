@@ -0,0 +1,6 @@
+import sys
+from pathlib import Path
+
+# Los módulos del backend se importan como módulos de primer nivel (uvicorn server:app)
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
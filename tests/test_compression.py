@@ -0,0 +1,41 @@
+import gzip
+
+import pytest
+
+from compression import Compressor, negotiate, parse_accept_encoding
+
+
+def test_parse_accept_encoding_qualities():
+    assert parse_accept_encoding("gzip, br;q=0.5, Zstd;q=0") == {"gzip": 1.0, "br": 0.5, "zstd": 0.0}
+
+
+def test_parse_accept_encoding_skips_malformed_entries():
+    assert parse_accept_encoding("gzip;q=abc, , br") == {"br": 1.0}
+    assert parse_accept_encoding("") == {}
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip, br", "br"),
+    ("gzip", "gzip"),
+    ("br;q=0, gzip", "gzip"),
+    ("*", "br"),
+    ("*, br;q=0", "zstd"),
+    ("*;q=0, gzip", "gzip"),
+    ("identity", None),
+    ("", None),
+])
+def test_negotiate_follows_server_preference(header, expected):
+    assert negotiate(header, ["br", "zstd", "gzip"]) == expected
+
+
+def test_negotiate_ignores_unavailable_encodings():
+    assert negotiate("br, zstd", ["gzip"]) is None
+
+
+def test_gzip_compressor_round_trip():
+    compressor = Compressor("gzip", 5)
+    body = b'{"id": "1"}' * 200
+
+    compressed = compressor.compress(body[:1000]) + compressor.compress(body[1000:]) + compressor.flush()
+
+    assert gzip.decompress(compressed) == body
@@ -0,0 +1,129 @@
+import asyncio
+import socket
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from aiosmtpd.controller import Controller
+
+import server
+
+
+class RecordingHandler:
+    """Acepta los mensajes salvo los dirigidos a `rejected`, que responden 550"""
+    def __init__(self, rejected=()):
+        self.rejected = set(rejected)
+        self.messages = []
+
+    async def handle_RCPT(self, smtp_server, session, envelope, address, rcpt_options):
+        if address in self.rejected:
+            return "550 Mailbox unavailable"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, smtp_server, session, envelope):
+        self.messages.append(envelope)
+        return "250 Message accepted for delivery"
+
+
+class FakeOutbox:
+    def __init__(self):
+        self.operations = []
+
+    async def bulk_write(self, operations, ordered=True):
+        self.operations.extend(operations)
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.email_outbox = FakeOutbox()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def outbox_message(message_id, to, attempts=1):
+    return {"id": message_id, "to": to, "subject": f"Subject {message_id}", "body": "Hello", "attempts": attempts}
+
+
+@pytest.fixture
+def smtp_handler(monkeypatch):
+    handler = RecordingHandler(rejected={"rejected@example.com"})
+    controller = Controller(handler, hostname="127.0.0.1", port=free_port())
+    controller.start()
+    monkeypatch.setattr(server, "SMTP_HOST", controller.hostname)
+    monkeypatch.setattr(server, "SMTP_PORT", controller.port)
+    monkeypatch.setattr(server, "SMTP_USERNAME", None)
+    monkeypatch.setattr(server, "SMTP_STARTTLS", False)
+    yield handler
+    controller.stop()
+
+
+def test_deliver_email_batch_sends_over_one_connection(smtp_handler):
+    messages = [outbox_message("1", "a@example.com"), outbox_message("2", "b@example.com")]
+
+    results = server.deliver_email_batch(messages)
+
+    assert results == {"1": None, "2": None}
+    assert [envelope.rcpt_tos for envelope in smtp_handler.messages] == [["a@example.com"], ["b@example.com"]]
+
+
+def test_deliver_email_batch_reports_rejected_recipients(smtp_handler):
+    messages = [outbox_message("1", "rejected@example.com"), outbox_message("2", "b@example.com")]
+
+    results = server.deliver_email_batch(messages)
+
+    assert "Mailbox unavailable" in results["1"]
+    assert results["2"] is None
+    assert len(smtp_handler.messages) == 1
+
+
+def test_deliver_email_batch_reports_connection_failures(monkeypatch):
+    monkeypatch.setattr(server, "SMTP_HOST", "127.0.0.1")
+    monkeypatch.setattr(server, "SMTP_PORT", free_port())
+
+    results = server.deliver_email_batch([outbox_message("1", "a@example.com")])
+
+    assert results["1"].startswith("SMTP connection failed")
+
+
+def test_email_outbox_update_outcomes(monkeypatch):
+    monkeypatch.setattr(server, "EMAIL_OUTBOX_MAX_ATTEMPTS", 3)
+    monkeypatch.setattr(server, "EMAIL_OUTBOX_BACKOFF_SECONDS", 10)
+    now = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+    sent = server.email_outbox_update(outbox_message("1", "a@example.com"), None, now)
+    assert sent["status"] == "sent"
+    assert sent["finished_at"] == now
+
+    retried = server.email_outbox_update(outbox_message("2", "b@example.com", attempts=2), "550", now)
+    assert retried["status"] == "pending"
+    assert retried["next_attempt_at"] == now + timedelta(seconds=20)
+    assert "finished_at" not in retried
+
+    failed = server.email_outbox_update(outbox_message("3", "c@example.com", attempts=3), "550", now)
+    assert failed["status"] == "failed"
+    assert failed["finished_at"] == now
+    assert failed["last_error"] == "550"
+
+
+def test_worker_records_sent_retried_and_failed(smtp_handler, monkeypatch):
+    database = FakeDatabase()
+    monkeypatch.setattr(server, "db", database)
+    monkeypatch.setattr(server, "EMAIL_OUTBOX_MAX_ATTEMPTS", 2)
+    batch = [
+        outbox_message("sent", "a@example.com"),
+        outbox_message("retried", "rejected@example.com", attempts=1),
+        outbox_message("failed", "rejected@example.com", attempts=2),
+    ]
+
+    results = server.deliver_email_batch(batch)
+    asyncio.run(server.EmailOutboxWorker()._record_results(batch, results))
+
+    statuses = {
+        operation._filter["id"]: operation._doc["$set"]["status"]
+        for operation in database.email_outbox.operations
+    }
+    assert statuses == {"sent": "sent", "retried": "pending", "failed": "failed"}
@@ -0,0 +1,45 @@
+from datetime import datetime, timezone
+
+import pytest
+from starlette.requests import Request
+
+from server import document_etag, etag_matches, make_etag
+
+
+def request_with(if_none_match=None):
+    headers = [] if if_none_match is None else [(b"if-none-match", if_none_match.encode())]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+ETAG = make_etag("patient-1", "2025-01-01T00:00:00+00:00")
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, False),
+    (ETAG, True),
+    (f"W/{ETAG}", True),
+    (f'"other", {ETAG}', True),
+    ('"other"', False),
+    ("*", True),
+])
+def test_etag_matches(header, expected):
+    assert etag_matches(request_with(header), ETAG) is expected
+
+
+def test_weak_etag_matches_strong_header():
+    assert etag_matches(request_with(ETAG), f"W/{ETAG}")
+
+
+def test_missing_etag_never_matches():
+    assert not etag_matches(request_with("*"), None)
+
+
+def test_document_etag_changes_with_updates_and_variants():
+    updated_at = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+    etag = document_etag("patient-1", updated_at)
+
+    assert etag == document_etag("patient-1", updated_at)
+    assert etag != document_etag("patient-1", datetime(2025, 1, 2, tzinfo=timezone.utc))
+    assert etag != document_etag("patient-1", updated_at, "summary")
+    assert document_etag("patient-1", None) is None
@@ -0,0 +1,34 @@
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from server import decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip_by_id():
+    cursor = encode_cursor({"id": "b7c1"}, "id")
+
+    assert decode_cursor(cursor) == ("b7c1", "b7c1")
+
+
+def test_cursor_round_trip_keeps_datetimes():
+    payment_date = datetime(2025, 3, 1, 9, 30, tzinfo=timezone.utc)
+    cursor = encode_cursor({"id": "p-1", "payment_date": payment_date}, "payment_date")
+
+    assert decode_cursor(cursor) == (payment_date, "p-1")
+
+
+def test_cursor_is_url_safe_without_padding():
+    cursor = encode_cursor({"id": "x" * 7, "name": "ñandú?&/"}, "name")
+
+    assert "=" not in cursor
+    assert set(cursor) <= set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_")
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "e30", "W10", "eyJ2IjoxfQ"])
+def test_invalid_cursor_is_a_bad_request(cursor):
+    with pytest.raises(HTTPException) as excinfo:
+        decode_cursor(cursor)
+
+    assert excinfo.value.status_code == 400
@@ -0,0 +1,92 @@
+from types import SimpleNamespace
+
+import pytest
+
+import policy
+
+
+def make_user(role, user_id="user-1", center_id="center-1"):
+    return SimpleNamespace(id=user_id, role=role, center_id=center_id)
+
+
+@pytest.mark.parametrize("role, resource, expected", [
+    (policy.SUPER_ADMIN, policy.PATIENT, {}),
+    (policy.CENTER_ADMIN, policy.PATIENT, {"center_id": "center-1"}),
+    (policy.PSYCHOLOGIST, policy.PATIENT, {"psychologist_id": "user-1"}),
+    (policy.SUPER_ADMIN, policy.OWNED_RECORD, {}),
+    (policy.CENTER_ADMIN, policy.OWNED_RECORD, {}),
+    (policy.PSYCHOLOGIST, policy.OWNED_RECORD, {"psychologist_id": "user-1"}),
+])
+def test_compile_filter_matrix(role, resource, expected):
+    assert policy.compile_filter(make_user(role), resource) == expected
+
+
+@pytest.mark.parametrize("role, document, allowed", [
+    (policy.SUPER_ADMIN, {"psychologist_id": "other", "center_id": "center-2"}, True),
+    (policy.CENTER_ADMIN, {"psychologist_id": "other", "center_id": "center-1"}, True),
+    (policy.CENTER_ADMIN, {"psychologist_id": "other", "center_id": "center-2"}, False),
+    (policy.PSYCHOLOGIST, {"psychologist_id": "user-1", "center_id": "center-2"}, True),
+    (policy.PSYCHOLOGIST, {"psychologist_id": "other", "center_id": "center-1"}, False),
+])
+def test_allows_patient(role, document, allowed):
+    assert policy.allows(make_user(role), policy.PATIENT, document) is allowed
+
+
+def test_center_admin_without_center_is_denied():
+    user = make_user(policy.CENTER_ADMIN, center_id=None)
+
+    with pytest.raises(policy.AccessDenied):
+        policy.compile_filter(user, policy.PATIENT)
+    assert not policy.allows(user, policy.PATIENT, {"psychologist_id": "other", "center_id": None})
+
+
+@pytest.mark.parametrize("resource", [policy.PATIENT_LIST, policy.RECORD_LIST])
+def test_center_admin_without_center_cannot_list(resource):
+    with pytest.raises(policy.AccessDenied):
+        policy.compile_filter(make_user(policy.CENTER_ADMIN, center_id=None), resource)
+
+
+def test_patient_list_includes_shared_and_context_patients():
+    user = make_user(policy.PSYCHOLOGIST)
+    filter_ = policy.compile_filter(user, policy.PATIENT_LIST)
+
+    assert policy.matches(filter_, {"psychologist_id": "user-1"})
+    assert policy.matches(filter_, {"psychologist_id": "other", "shared_with": ["user-2", "user-1"]})
+    assert policy.matches(filter_, {"psychologist_id": "other", "database_context": "user-1"})
+    assert not policy.matches(filter_, {"psychologist_id": "other", "shared_with": ["user-2"]})
+
+
+def test_record_list_for_center_admin_uses_center_psychologists():
+    user = make_user(policy.CENTER_ADMIN, user_id="admin-1")
+
+    filter_ = policy.compile_filter(user, policy.RECORD_LIST, center_psychologist_ids=["psy-1", "psy-2"])
+
+    assert filter_ == {"psychologist_id": {"$in": ["psy-1", "psy-2", "admin-1"]}}
+    assert policy.compile_filter(make_user(policy.SUPER_ADMIN), policy.RECORD_LIST) == {}
+    assert policy.compile_filter(make_user(policy.PSYCHOLOGIST), policy.RECORD_LIST) == {"psychologist_id": "user-1"}
+
+
+def test_unknown_role_is_denied():
+    user = make_user("receptionist")
+
+    with pytest.raises(policy.AccessDenied):
+        policy.compile_filter(user, policy.PATIENT)
+    assert not policy.allows(user, policy.OWNED_RECORD, {"psychologist_id": "user-1"})
+
+
+def test_unknown_resource_raises_value_error():
+    with pytest.raises(ValueError):
+        policy.compile_filter(make_user(policy.SUPER_ADMIN), "invoices")
+
+
+def test_matches_in_operator():
+    filter_ = {"psychologist_id": {"$in": ["user-1", "user-2"]}}
+
+    assert policy.matches(filter_, {"psychologist_id": "user-2"})
+    assert not policy.matches(filter_, {"psychologist_id": "user-3"})
+    assert not policy.matches(filter_, {})
+
+
+def test_matches_rejects_unsupported_operators():
+    with pytest.raises(ValueError):
+        policy.matches({"center_id": {"$ne": None}}, {"center_id": "center-1"})